@@ -0,0 +1,74 @@
+"""Замер расчёта рекомендаций на синтетическом графе подписок.
+
+Граф строится в памяти, без базы: число подписок у пользователей
+и популярность авторов подчиняются закону Ципфа, как в seed. Расчёт
+для выборки пользователей даёт скорость, по которой оценивается
+полный пересчёт.
+"""
+import random
+import resource
+import time
+from collections import defaultdict
+
+from posts.suggestions import Graph
+
+from .runner import percentile
+from .seed import zipf_weights
+
+
+def synthetic_graph(users, edges, random_seed=42):
+    """Словарь «пользователь → авторы» ровно с edges рёбрами."""
+    rng = random.Random(random_seed)
+    authors = list(range(users))
+    rng.shuffle(authors)
+    author_weights = zipf_weights(users)
+    # Активность читателей тоже перекошена: кто-то подписан на сотни.
+    readers = list(range(users))
+    rng.shuffle(readers)
+    reader_weights = zipf_weights(users, exponent=0.8)
+    following_ids = defaultdict(set)
+    total = 0
+    # Повторные пары отбрасываются, поэтому тянем, пока не наберём edges.
+    while total < edges:
+        size = edges - total
+        picks = zip(
+            rng.choices(readers, cum_weights=reader_weights, k=size),
+            rng.choices(authors, cum_weights=author_weights, k=size),
+        )
+        for user_id, author_id in picks:
+            targets = following_ids[user_id]
+            if user_id != author_id and author_id not in targets:
+                targets.add(author_id)
+                total += 1
+    return following_ids
+
+
+def run(users=50000, edges=1000000, sample=2000, top=20, random_seed=42):
+    started = time.perf_counter()
+    following_ids = synthetic_graph(users, edges, random_seed)
+    build_s = time.perf_counter() - started
+    graph = Graph(following_ids)
+    rng = random.Random(random_seed)
+    sampled = rng.sample(range(users), min(sample, users))
+    timings = []
+    started = time.perf_counter()
+    for user_id in sampled:
+        begin = time.perf_counter()
+        graph.suggest(user_id, top)
+        timings.append((time.perf_counter() - begin) * 1000)
+    elapsed = time.perf_counter() - started
+    rate = len(sampled) / elapsed if elapsed else 0
+    return {
+        'users': users,
+        'edges': sum(len(authors) for authors in following_ids.values()),
+        'build_s': round(build_s, 2),
+        'sample': len(sampled),
+        'users_per_s': round(rate),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'full_refresh_s': round(users / rate, 1) if rate else None,
+        # ru_maxrss в Linux — в килобайтах.
+        'max_rss_mb': round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        ),
+    }
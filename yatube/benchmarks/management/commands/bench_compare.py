@@ -0,0 +1,30 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from benchmarks import runner
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает два JSON-результата bench_run.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('before')
+        parser.add_argument('after')
+        parser.add_argument(
+            '--metric', default='p50_ms',
+            choices=('p50_ms', 'p90_ms', 'p99_ms', 'mean_ms', 'queries',
+                     'peak_kb'),
+        )
+
+    def handle(self, *args, before, after, metric, **options):
+        with open(before, encoding='utf-8') as stream:
+            old = json.load(stream)
+        with open(after, encoding='utf-8') as stream:
+            new = json.load(stream)
+        self.stdout.write(
+            f'{metric}: {old["meta"]["commit"]} → {new["meta"]["commit"]}'
+        )
+        for name, was, now, change in runner.compare(old, new, metric):
+            delta = '—' if change is None else f'{change:+.1f}%'
+            self.stdout.write(f'{name:<14} {was!s:>10} {now!s:>10} {delta:>9}')
@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import runner
+
+
+class Command(BaseCommand):
+    help = 'Замеряет задержку, число запросов и память страниц posts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default='-', help='JSON-файл; по умолчанию stdout.'
+        )
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.',
+        )
+        parser.add_argument(
+            '--only', nargs='+', metavar='SCENARIO',
+            help='Замерить только эти сценарии.',
+        )
+
+    def handle(self, *args, output, iterations, warmup, cold, only,
+               **options):
+        try:
+            results = runner.run(iterations, warmup, cold, only)
+        except (ValueError, RuntimeError) as error:
+            raise CommandError(error)
+        data = json.dumps(results, ensure_ascii=False, indent=2)
+        if output == '-':
+            self.stdout.write(data)
+            return
+        with open(output, 'w', encoding='utf-8') as stream:
+            stream.write(data)
+        for name, result in results['views'].items():
+            self.stderr.write(
+                f'{name}: p50 {result["p50_ms"]} мс, '
+                f'p99 {result["p99_ms"]} мс, {result["queries"]} запр.'
+            )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from benchmarks import seed
+
+
+class Command(BaseCommand):
+    help = 'Наполняет базу перекошенными данными для нагрузочных замеров.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', choices=sorted(seed.SIZES), default='small',
+        )
+        parser.add_argument(
+            '--flush', action='store_true',
+            help='Сначала удалить данные прошлого наполнения.',
+        )
+        parser.add_argument('--seed', dest='random_seed', type=int,
+                            default=42)
+
+    def handle(self, *args, size, flush, random_seed, **options):
+        if flush:
+            seed.flush()
+
+        def progress(name, done):
+            self.stderr.write(f'{name}: {done}')
+
+        counts = seed.seed(random_seed=random_seed, progress=progress,
+                           **seed.SIZES[size])
+        self.stdout.write(', '.join(
+            f'{name}: {count}' for name, count in counts.items()
+        ))
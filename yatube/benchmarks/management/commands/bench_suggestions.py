@@ -0,0 +1,20 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from benchmarks import graph
+
+
+class Command(BaseCommand):
+    help = 'Замеряет расчёт рекомендаций на синтетическом графе подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50000)
+        parser.add_argument('--edges', type=int, default=1000000)
+        parser.add_argument('--sample', type=int, default=2000)
+        parser.add_argument('--seed', dest='random_seed', type=int,
+                            default=42)
+
+    def handle(self, *args, users, edges, sample, random_seed, **options):
+        result = graph.run(users, edges, sample, random_seed=random_seed)
+        self.stdout.write(json.dumps(result, ensure_ascii=False, indent=2))
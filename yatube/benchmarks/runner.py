@@ -0,0 +1,177 @@
+"""Замеры представлений posts на наполненной базе.
+
+Каждый сценарий — GET одной страницы тестовым клиентом. Для каждого
+сценария снимаются перцентили задержки, число SQL-запросов и пиковый
+прирост памяти Python (tracemalloc) за запрос. Память меряется отдельным
+проходом: трассировка замедляет запрос и исказила бы задержки.
+Результат — словарь, который сохраняется в JSON и сравнивается
+с прогоном другого коммита.
+"""
+import platform
+import subprocess
+import time
+import tracemalloc
+from collections import namedtuple
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Follow, Group, Post, User
+from posts.paginator import encode_cursor
+from posts.views import AMOUNT_POST
+
+Scenario = namedtuple('Scenario', 'name url user')
+
+PERCENTILES = (50, 90, 99)
+MEMORY_ITERATIONS = 3
+DEEP_PAGE = 50
+
+
+def deep_page_url(number=DEEP_PAGE):
+    """Главная на странице number (или последней) по курсору ?after=.
+
+    Так до неё долистывает пользователь; ?page=N открывается через
+    OFFSET и мерил бы старый путь.
+    """
+    pages = -(-Post.objects.count() // AMOUNT_POST)
+    number = min(number, pages)
+    url = reverse('posts:index')
+    if number <= 1:
+        return url
+    row = Post.objects.order_by('-pub_date', '-id').values_list(
+        'pub_date', 'id'
+    )[(number - 1) * AMOUNT_POST - 1]
+    return f'{url}?after={encode_cursor(number, list(row))}'
+
+
+def scenarios():
+    """Страницы с самыми тяжёлыми объектами из наполненной базы."""
+    hot_group = Group.objects.order_by('-posts_count').first()
+    star = User.objects.order_by('-profile__followers_count').first()
+    thread = Post.objects.order_by('-comments_count').first()
+    reader = User.objects.annotate(
+        follows=Count('follower')
+    ).order_by('-follows').first()
+    if not (hot_group and star and thread and reader):
+        raise ValueError('База пуста: сначала запустите bench_seed')
+    return [
+        Scenario('index', reverse('posts:index'), None),
+        Scenario('index_deep', deep_page_url(), None),
+        Scenario('group_posts', reverse(
+            'posts:group_list', kwargs={'slug': hot_group.slug}), None),
+        Scenario('profile', reverse(
+            'posts:profile', kwargs={'username': star.username}), None),
+        Scenario('post_detail', reverse(
+            'posts:post_detail', kwargs={'post_id': thread.pk}), None),
+        Scenario('follow_index', reverse('posts:follow_index'), reader),
+        Scenario('search', reverse('posts:search') + '?q=кофе', None),
+    ]
+
+
+def percentile(values, rank):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(rank / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def _client(user):
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+    return client
+
+
+def measure(scenario, iterations, warmup=2, cold=False):
+    client = _client(scenario.user)
+    for _ in range(warmup):
+        client.get(scenario.url)
+    timings, queries, peaks = [], [], []
+    for _ in range(iterations):
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(scenario.url)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+        if response.status_code != 200:
+            raise RuntimeError(
+                f'{scenario.name}: {scenario.url} → {response.status_code}'
+            )
+    for _ in range(MEMORY_ITERATIONS):
+        if cold:
+            cache.clear()
+        tracemalloc.start()
+        try:
+            client.get(scenario.url)
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        finally:
+            tracemalloc.stop()
+    result = {
+        f'p{rank}_ms': round(percentile(timings, rank), 2)
+        for rank in PERCENTILES
+    }
+    result.update({
+        'mean_ms': round(sum(timings) / len(timings), 2),
+        'queries': max(queries),
+        'peak_kb': round(max(peaks), 1),
+        'url': scenario.url,
+    })
+    return result
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(iterations=30, warmup=2, cold=False, only=None):
+    """Прогоняет сценарии и возвращает результаты с описанием окружения."""
+    results = {}
+    for scenario in scenarios():
+        if only and scenario.name not in only:
+            continue
+        results[scenario.name] = measure(scenario, iterations, warmup, cold)
+    return {
+        'meta': {
+            'commit': _commit(),
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'cache': settings.CACHES['default']['BACKEND'],
+            'iterations': iterations,
+            'cold_cache': cold,
+            'dataset': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+        },
+        'views': results,
+    }
+
+
+def compare(before, after, metric='p50_ms'):
+    """Строки (сценарий, было, стало, изменение в %) по метрике."""
+    rows = []
+    for name, result in after['views'].items():
+        old = before['views'].get(name, {}).get(metric)
+        new = result.get(metric)
+        change = None
+        if old:
+            change = round((new - old) / old * 100, 1)
+        rows.append((name, old, new, change))
+    return rows
@@ -0,0 +1,160 @@
+"""Наполнение базы данными для нагрузочных замеров.
+
+Распределения перекошены, как на живом сайте: число подписчиков
+и постов у авторов, популярность групп и длина обсуждений подчиняются
+степенному закону (Zipf). Всё пишется через bulk_create пачками,
+затем счётчики, поисковый индекс и ленты пересобираются целиком.
+Пользователи получают имена с префиксом PREFIX, чтобы их можно было
+удалить перед новым наполнением: двоеточие не пропускает валидатор
+имён, так что настоящий пользователь такое имя получить не может.
+"""
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from posts import transfer
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+PREFIX = 'bench:'
+GROUP_PREFIX = 'bench-'
+BATCH_SIZE = 2000
+ZIPF = 1.1
+WORDS = (
+    'город', 'погода', 'кофе', 'книга', 'поезд', 'музыка', 'кошка',
+    'работа', 'отпуск', 'река', 'код', 'дождь', 'выставка', 'футбол',
+    'рецепт', 'утро', 'лес', 'друзья', 'фильм', 'море',
+)
+
+SIZES = {
+    'small': {'users': 200, 'groups': 10, 'posts': 5000,
+              'comments': 10000, 'follows': 3000},
+    'medium': {'users': 2000, 'groups': 30, 'posts': 100000,
+               'comments': 300000, 'follows': 40000},
+    'large': {'users': 20000, 'groups': 100, 'posts': 1000000,
+              'comments': 3000000, 'follows': 400000},
+}
+
+
+def zipf_weights(count, exponent=ZIPF):
+    """Накопленные веса: первый элемент популярнее всех."""
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, count + 1)))
+
+
+def _batches(total, size=BATCH_SIZE):
+    done = 0
+    while done < total:
+        step = min(size, total - done)
+        yield step
+        done += step
+
+
+def _text(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def flush():
+    """Удаляет всё, что создало прошлое наполнение.
+
+    Slug группы не может содержать двоеточие, поэтому группа удаляется,
+    только если после удаления пользователей наполнения в ней не
+    осталось постов.
+    """
+    User.objects.filter(username__startswith=PREFIX).delete()
+    Group.objects.filter(
+        slug__startswith=GROUP_PREFIX, posts__isnull=True
+    ).delete()
+
+
+def seed(users, groups, posts, comments, follows, random_seed=42,
+         progress=None):
+    """Создаёт данные и возвращает число записей по таблицам."""
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    report = progress or (lambda name, done: None)
+
+    User.objects.bulk_create(
+        (User(username=f'{PREFIX}{index}', password='!')
+         for index in range(users)),
+    )
+    user_ids = list(User.objects.filter(
+        username__startswith=PREFIX
+    ).order_by('pk').values_list('pk', flat=True))
+    report('users', len(user_ids))
+    # Порядок в списке — популярность: rng перемешивает, кто «звезда».
+    authors = user_ids[:]
+    rng.shuffle(authors)
+    author_weights = zipf_weights(len(authors))
+
+    Group.objects.bulk_create(
+        Group(title=f'Группа {index}', slug=f'{GROUP_PREFIX}{index}',
+              description=_text(rng))
+        for index in range(groups)
+    )
+    group_ids = list(Group.objects.filter(
+        slug__startswith=GROUP_PREFIX
+    ).order_by('pk').values_list('pk', flat=True))
+    group_weights = zipf_weights(len(group_ids))
+    report('groups', len(group_ids))
+
+    done = 0
+    for size in _batches(posts):
+        batch = []
+        for author_id in rng.choices(authors, cum_weights=author_weights,
+                                     k=size):
+            group_id = None
+            if group_ids and rng.random() < 0.7:
+                group_id = rng.choices(
+                    group_ids, cum_weights=group_weights
+                )[0]
+            batch.append(Post(
+                author_id=author_id, group_id=group_id,
+                text=_text(rng, rng.randint(5, 60)),
+                pub_date=now - timedelta(seconds=rng.randint(0, 365 * 86400)),
+            ))
+        with transfer.keep_dates(Post):
+            Post.objects.bulk_create(batch)
+        done += size
+        report('posts', done)
+
+    post_ids = list(Post.objects.filter(
+        author__username__startswith=PREFIX
+    ).values_list('pk', flat=True))
+    rng.shuffle(post_ids)
+    post_weights = zipf_weights(len(post_ids))
+    done = 0
+    for size in _batches(comments if post_ids else 0):
+        Comment.objects.bulk_create(
+            Comment(post_id=post_id, author_id=rng.choice(user_ids),
+                    text=_text(rng, rng.randint(3, 30)))
+            for post_id in rng.choices(post_ids, cum_weights=post_weights,
+                                       k=size)
+        )
+        done += size
+        report('comments', done)
+
+    pairs = set()
+    attempts = 0
+    while len(pairs) < follows and attempts < follows * 10:
+        attempts += 1
+        user_id = rng.choice(user_ids)
+        author_id = rng.choices(authors, cum_weights=author_weights)[0]
+        if user_id != author_id:
+            pairs.add((user_id, author_id))
+    Follow.objects.bulk_create(
+        (Follow(user_id=user_id, author_id=author_id)
+         for user_id, author_id in pairs),
+        ignore_conflicts=True,
+    )
+    report('follows', len(pairs))
+
+    transfer.rebuild_derived()
+    return {
+        'users': len(user_ids), 'groups': len(group_ids), 'posts': posts,
+        'comments': comments, 'follows': len(pairs),
+    }
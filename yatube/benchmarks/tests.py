@@ -0,0 +1,68 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from benchmarks import graph, runner, seed
+from posts.models import Follow, Group, Post, TimelineEntry, User
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.counts = seed.seed(users=20, groups=3, posts=200, comments=300,
+                               follows=60)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_seed_creates_skewed_data(self):
+        """Наполнение создаёт данные и пересобирает ленты."""
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Follow.objects.count(), self.counts['follows'])
+        self.assertTrue(TimelineEntry.objects.exists())
+        star = User.objects.order_by('-profile__posts_count').first()
+        # Самый плодовитый автор пишет заметно больше среднего.
+        self.assertGreater(star.profile.posts_count, 200 / 20)
+
+    def test_flush_keeps_real_data(self):
+        """flush не трогает пользователей и группы вне наполнения."""
+        user = User.objects.create_user(username='benchmark')
+        group = Group.objects.create(title='Настоящая', slug='bench-real')
+        Post.objects.create(author=user, group=group, text='Свой пост')
+        seed.flush()
+        self.assertFalse(User.objects.filter(
+            username__startswith=seed.PREFIX
+        ).exists())
+        self.assertEqual(Group.objects.get().pk, group.pk)
+        self.assertEqual(Post.objects.get().author, user)
+
+    def test_run_reports_every_scenario(self):
+        """В результате есть перцентили, запросы и память по сценариям."""
+        results = runner.run(iterations=2, warmup=0)
+        self.assertEqual(results['meta']['dataset']['posts'], 200)
+        self.assertEqual(
+            set(results['views']),
+            {scenario.name for scenario in runner.scenarios()},
+        )
+        for result in results['views'].values():
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreater(result['queries'], 0)
+
+    def test_deep_page_uses_cursor(self):
+        url = runner.deep_page_url()
+        self.assertIn('after=', url)
+        page = self.client.get(url).context['page_obj']
+        self.assertEqual(page.number, 20)
+        self.assertFalse(page.has_next())
+
+    def test_compare(self):
+        before = {'views': {'index': {'p50_ms': 10.0}}}
+        after = {'views': {'index': {'p50_ms': 12.0}, 'new': {'p50_ms': 1}}}
+        self.assertEqual(runner.compare(before, after), [
+            ('index', 10.0, 12.0, 20.0), ('new', None, 1, None),
+        ])
+
+    def test_suggestions_benchmark(self):
+        result = graph.run(users=300, edges=3000, sample=50)
+        self.assertEqual(result['edges'], 3000)
+        self.assertEqual(result['sample'], 50)
+        self.assertGreater(result['users_per_s'], 0)
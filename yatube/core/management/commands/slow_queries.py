@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from core import slow_queries
+
+
+class Command(BaseCommand):
+    help = 'Сводка журнала медленных SQL-запросов по отпечаткам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log', help='Файл журнала; по умолчанию METRICS_SLOW_QUERY_LOG.'
+        )
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--sort', choices=('total_ms', 'max_ms', 'count'),
+            default='total_ms',
+        )
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Очистить журнал после вывода.',
+        )
+
+    def handle(self, *args, log, limit, sort, clear, **options):
+        groups = slow_queries.summarize(slow_queries.read(log))
+        groups.sort(key=lambda group: -group[sort])
+        if not groups:
+            self.stdout.write('Медленных запросов нет.')
+        for group in groups[:limit]:
+            self.stdout.write(self.style.WARNING(
+                f'{group["fingerprint"]}: {group["count"]} раз, '
+                f'всего {group["total_ms"]:.1f} мс, '
+                f'максимум {group["max_ms"]:.1f} мс, '
+                f'последний {group["last_seen"]}'
+            ))
+            self.stdout.write(f'  {group["sql"]}')
+            for label, values in (('view', group['views']),
+                                  ('откуда', group['origins'])):
+                if values:
+                    values = ', '.join(sorted(values))
+                    self.stdout.write(f'  {label}: {values}')
+            for step in group['plan'] or ():
+                self.stdout.write(f'  план: {step}')
+        if clear:
+            slow_queries.clear(log)
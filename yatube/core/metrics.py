@@ -0,0 +1,238 @@
+"""Метрики запросов по именам view.
+
+RequestMetricsMiddleware заводит на время запроса RequestMetrics:
+время ответа, число и время SQL-запросов (через execute_wrapper),
+время отрисовки шаблонов (InstrumentedTemplates в TEMPLATES), попадания
+и промахи кэша страниц и размер ответа. По завершении запрос попадает
+в агрегаты своего view: счётчики и гистограмма времени с фиксированными
+корзинами, так что память не растёт с числом запросов. Медленные
+запросы (METRICS_SLOW_REQUEST_MS) сохраняются целиком вместе со списком
+SQL, но не больше SLOW_TRACES последних.
+
+Агрегаты живут в памяти процесса: у каждого воркера свои.
+"""
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+from django.template.backends.django import Template as BackendTemplate
+
+# Верхние границы корзин гистограммы, мс; последняя корзина — всё, что выше.
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+SLOW_REQUEST_MS = 500
+SLOW_SAMPLE_RATE = 1.0
+SLOW_TRACES = 50
+TRACE_QUERIES = 200
+
+_local = threading.local()
+_lock = threading.Lock()
+_views = {}
+_slow = deque(maxlen=SLOW_TRACES)
+
+
+def enabled():
+    return getattr(settings, 'METRICS_ENABLED', True)
+
+
+def slow_request_ms():
+    return getattr(settings, 'METRICS_SLOW_REQUEST_MS', SLOW_REQUEST_MS)
+
+
+def slow_sample_rate():
+    return getattr(settings, 'METRICS_SLOW_SAMPLE_RATE', SLOW_SAMPLE_RATE)
+
+
+def current():
+    """Метрики текущего запроса или None вне запроса."""
+    return getattr(_local, 'metrics', None)
+
+
+def count(name, amount=1):
+    """Увеличивает счётчик текущего запроса, если он есть."""
+    metrics = current()
+    if metrics is not None:
+        metrics.counters[name] = metrics.counters.get(name, 0) + amount
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view = None
+        self.queries = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+        self.counters = {}
+        # Только ссылки на строки SQL: текст и параметры не копируются.
+        self.trace = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.queries += 1
+            self.db_ms += elapsed
+            if len(self.trace) < TRACE_QUERIES:
+                self.trace.append((sql, elapsed))
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+
+class ViewStats:
+    """Агрегаты одного view."""
+
+    FIELDS = ('requests', 'errors', 'total_ms', 'db_ms', 'queries',
+              'template_ms', 'bytes')
+
+    def __init__(self):
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+        self.max_ms = 0.0
+        self.counters = {}
+        self.histogram = [0] * (len(BUCKETS) + 1)
+
+    def add(self, metrics, elapsed, status, size):
+        self.requests += 1
+        self.errors += status >= 500
+        self.total_ms += elapsed
+        self.max_ms = max(self.max_ms, elapsed)
+        self.db_ms += metrics.db_ms
+        self.queries += metrics.queries
+        self.template_ms += metrics.template_ms
+        self.bytes += size
+        self.histogram[bisect_left(BUCKETS, elapsed)] += 1
+        for name, amount in metrics.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def percentile(self, rank):
+        """Верхняя граница корзины, в которую попадает перцентиль."""
+        threshold = self.requests * rank / 100
+        seen = 0
+        for index, amount in enumerate(self.histogram):
+            seen += amount
+            if amount and seen >= threshold:
+                return BUCKETS[index] if index < len(BUCKETS) else None
+        return None
+
+    def as_dict(self):
+        requests = self.requests or 1
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'mean_ms': round(self.total_ms / requests, 2),
+            'max_ms': round(self.max_ms, 2),
+            'p50_ms': self.percentile(50),
+            'p90_ms': self.percentile(90),
+            'p99_ms': self.percentile(99),
+            'queries_per_request': round(self.queries / requests, 2),
+            'db_ms_per_request': round(self.db_ms / requests, 2),
+            'template_ms_per_request': round(self.template_ms / requests, 2),
+            'bytes_per_request': round(self.bytes / requests),
+            'counters': dict(self.counters),
+            'histogram': dict(zip(
+                [f'<={bucket}' for bucket in BUCKETS] + ['inf'],
+                self.histogram,
+            )),
+        }
+
+
+def record(view_name, metrics, status, size):
+    elapsed = metrics.elapsed_ms()
+    with _lock:
+        stats = _views.get(view_name)
+        if stats is None:
+            stats = _views[view_name] = ViewStats()
+        stats.add(metrics, elapsed, status, size)
+    if elapsed >= slow_request_ms() and random.random() < slow_sample_rate():
+        _slow.append({
+            'view': view_name,
+            'elapsed_ms': round(elapsed, 2),
+            'status': status,
+            'queries': [
+                {'sql': sql, 'ms': round(ms, 2)} for sql, ms in metrics.trace
+            ],
+        })
+
+
+def snapshot():
+    """Агрегаты по view и последние медленные запросы."""
+    with _lock:
+        views = {name: stats.as_dict() for name, stats in _views.items()}
+        slow = list(_slow)
+    return {'views': views, 'slow_requests': slow}
+
+
+def reset():
+    with _lock:
+        _views.clear()
+        _slow.clear()
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    # Имя по app_name, а не по namespace из include(): оно не зависит
+    # от того, под каким пространством подключены urls приложения.
+    if match.url_name:
+        return ':'.join(match.app_names + [match.url_name])
+    return match._func_path
+
+
+class RequestMetricsMiddleware:
+    """Собирает метрики каждого запроса в агрегаты его view."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not enabled():
+            return self.get_response(request)
+        metrics = _local.metrics = RequestMetrics()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _local.metrics = None
+        size = 0 if response.streaming else len(response.content)
+        record(_view_name(request), metrics, response.status_code, size)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = current()
+        if metrics is not None:
+            metrics.view = _view_name(request)
+
+
+class InstrumentedTemplate(BackendTemplate):
+    def render(self, context=None, request=None):
+        metrics = current()
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_ms += (time.perf_counter() - started) * 1000
+
+
+class InstrumentedTemplates(DjangoTemplates):
+    """Движок DTL, который засекает время отрисовки шаблонов."""
+
+    def from_string(self, template_code):
+        template = super().from_string(template_code)
+        return InstrumentedTemplate(template.template, self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
@@ -0,0 +1,199 @@
+"""Журнал медленных SQL-запросов.
+
+К каждому соединению с базой при его открытии подключается
+execute_wrapper (см. CoreConfig.ready). Запрос дольше
+METRICS_SLOW_QUERY_MS записывается строкой NDJSON в METRICS_SLOW_QUERY_LOG
+вместе с отпечатком (SQL без литералов и списков параметров), view
+текущего запроса и местом в коде проекта, откуда он пришёл. Для SELECT
+сразу снимается план (EXPLAIN QUERY PLAN на SQLite) — один раз на
+отпечаток в процессе. Команда slow_queries сводит журнал по отпечаткам.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = 100
+PLANS_LIMIT = 1000
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE = re.compile(r'\s+')
+# Кадры, которые не считаются источником запроса.
+_SKIP = ('site-packages', __file__, metrics.__file__)
+
+_lock = threading.Lock()
+_plans = {}
+
+
+def threshold_ms():
+    return getattr(settings, 'METRICS_SLOW_QUERY_MS', SLOW_QUERY_MS)
+
+
+def log_path():
+    return getattr(
+        settings, 'METRICS_SLOW_QUERY_LOG',
+        os.path.join(settings.BASE_DIR, 'logs', 'slow_queries.ndjson'),
+    )
+
+
+def normalize(sql):
+    """SQL без конкретных значений: одинаков для запросов одной формы."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql.replace('%s', '?'))
+    sql = _LIST.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.md5(normalize(sql).encode()).hexdigest()[:12]
+
+
+def origin():
+    """Последний кадр стека из кода проекта, а не Django и библиотек."""
+    base = settings.BASE_DIR
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(base) and not any(
+            part in frame.filename for part in _SKIP
+        ):
+            path = os.path.relpath(frame.filename, base)
+            return f'{path}:{frame.lineno} in {frame.name}'
+    return None
+
+
+def explain(connection, sql, params):
+    """План запроса или None, если его нельзя снять."""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    prefix = connection.ops.explain_query_prefix()
+    try:
+        with connection.cursor() as cursor:
+            # Курсор бэкенда, минуя execute_wrapper: план не должен
+            # попасть ни в этот журнал, ни в метрики запроса.
+            cursor.cursor.execute(f'{prefix} {sql}', params)
+            # У SQLite текст шага — последний столбец (detail).
+            return [str(row[-1]) for row in cursor.fetchall()]
+    except Exception:
+        logger.debug('Не удалось снять план запроса', exc_info=True)
+        return None
+
+
+def _plan(print_, connection, sql, params):
+    with _lock:
+        if print_ in _plans:
+            return None
+    plan = explain(connection, sql, params)
+    with _lock:
+        if len(_plans) < PLANS_LIMIT:
+            _plans[print_] = True
+    return plan
+
+
+def write(entry):
+    path = log_path()
+    line = json.dumps(entry, ensure_ascii=False)
+    with _lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as stream:
+            stream.write(line + '\n')
+
+
+def read(path=None):
+    """Записи журнала; битые строки пропускаются."""
+    path = path or log_path()
+    if not os.path.exists(path):
+        return
+    with open(path, encoding='utf-8') as stream:
+        for line in stream:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def summarize(entries):
+    """Записи, сведённые по отпечатку, от самых дорогих по сумме времени."""
+    groups = {}
+    for entry in entries:
+        group = groups.get(entry['fingerprint'])
+        if group is None:
+            group = groups[entry['fingerprint']] = {
+                'fingerprint': entry['fingerprint'],
+                'sql': entry['sql'],
+                'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'origins': set(), 'views': set(), 'plan': None,
+                'last_seen': entry['time'],
+            }
+        group['count'] += 1
+        group['total_ms'] += entry['ms']
+        group['max_ms'] = max(group['max_ms'], entry['ms'])
+        group['last_seen'] = max(group['last_seen'], entry['time'])
+        group['plan'] = entry.get('plan') or group['plan']
+        for key, field in (('origins', 'origin'), ('views', 'view')):
+            if entry.get(field):
+                group[key].add(entry[field])
+    return sorted(groups.values(), key=lambda group: -group['total_ms'])
+
+
+def clear(path=None):
+    path = path or log_path()
+    with _lock:
+        _plans.clear()
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class SlowQueryLogger:
+    """execute_wrapper соединения, который пишет медленные запросы."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __call__(self, execute, sql, params, many, context):
+        limit = threshold_ms()
+        if limit is None:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        elapsed = (time.perf_counter() - started) * 1000
+        if elapsed >= limit:
+            self.log(sql, params, many, elapsed)
+        return result
+
+    def log(self, sql, params, many, elapsed):
+        print_ = fingerprint(sql)
+        request_metrics = metrics.current()
+        entry = {
+            'time': timezone.now().isoformat(),
+            'fingerprint': print_,
+            'sql': normalize(sql),
+            'ms': round(elapsed, 2),
+            'database': self.connection.alias,
+            'view': request_metrics.view if request_metrics else None,
+            'origin': origin(),
+            'plan': None,
+        }
+        if not many:
+            entry['plan'] = _plan(print_, self.connection, sql, params)
+        logger.warning('Медленный запрос %s (%.1f мс): %s',
+                       print_, elapsed, entry['sql'])
+        write(entry)
+
+
+def install(sender, connection, **kwargs):
+    """Подключает журнал к новому соединению (сигнал connection_created)."""
+    if not any(isinstance(wrapper, SlowQueryLogger)
+               for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.append(SlowQueryLogger(connection))
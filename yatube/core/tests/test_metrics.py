@@ -0,0 +1,57 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+from posts.models import Post
+
+User = get_user_model()
+
+
+class RequestMetricsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+        metrics.reset()
+
+    def test_requests_aggregated_by_view(self):
+        """Запросы попадают в сводку своего view вместе с кэшем страниц."""
+        for _ in range(2):
+            self.guest_client.get(reverse('posts:index'))
+        stats = metrics.snapshot()['views']['posts:index']
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(
+            stats['counters'], {'page_cache_miss': 1, 'page_cache_hit': 1}
+        )
+        self.assertGreater(stats['queries_per_request'], 0)
+        self.assertGreater(stats['template_ms_per_request'], 0)
+        self.assertGreater(stats['bytes_per_request'], 0)
+        self.assertEqual(sum(stats['histogram'].values()), 2)
+
+    @override_settings(METRICS_SLOW_REQUEST_MS=0)
+    def test_slow_request_trace(self):
+        self.guest_client.get(reverse('posts:index'))
+        slow = metrics.snapshot()['slow_requests']
+        self.assertEqual(slow[-1]['view'], 'posts:index')
+        self.assertTrue(slow[-1]['queries'])
+
+    def test_endpoint_for_staff_only(self):
+        url = reverse('request_metrics')
+        response = self.guest_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.guest_client.force_login(
+            User.objects.create_user(username='staff', is_staff=True)
+        )
+        response = self.guest_client.get(url)
+        self.assertEqual(
+            response.json()['views']['request_metrics']['requests'], 1
+        )
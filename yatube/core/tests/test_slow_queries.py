@@ -0,0 +1,96 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import metrics, slow_queries
+from posts.models import Follow, Post
+
+User = get_user_model()
+
+
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=cls.reader, author=author)
+        Post.objects.create(author=author, text='Пост')
+
+    def setUp(self):
+        self.log = os.path.join(tempfile.mkdtemp(), 'slow.ndjson')
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def tearDown(self):
+        slow_queries.clear(self.log)
+        os.rmdir(os.path.dirname(self.log))
+
+    def test_normalize(self):
+        self.assertEqual(
+            slow_queries.normalize(
+                "SELECT * FROM t WHERE a = 'x' AND id IN (%s, %s,  %s)"
+            ),
+            'SELECT * FROM t WHERE a = ? AND id IN (...)',
+        )
+        self.assertEqual(
+            slow_queries.fingerprint('SELECT 1 WHERE id IN (1, 2)'),
+            slow_queries.fingerprint('SELECT 7 WHERE id IN (3)'),
+        )
+
+    def test_slow_queries_logged_with_plan_and_origin(self):
+        with self.settings(METRICS_SLOW_QUERY_MS=0,
+                           METRICS_SLOW_QUERY_LOG=self.log), \
+                self.assertLogs('core.slow_queries', 'WARNING') as logs:
+            for _ in range(2):
+                self.client.get(reverse('posts:follow_index'))
+                cache.clear()
+        self.assertIn('Медленный запрос', logs.output[0])
+        groups = slow_queries.summarize(slow_queries.read(self.log))
+        timeline = [
+            group for group in groups
+            if 'posts_timelineentry' in group['sql']
+        ]
+        self.assertTrue(timeline)
+        self.assertEqual(timeline[0]['count'], 2)
+        self.assertEqual(timeline[0]['views'], {'posts:follow_index'})
+        self.assertTrue(timeline[0]['plan'])
+        self.assertTrue(all(
+            origin.startswith('posts' + os.sep)
+            for origin in timeline[0]['origins']
+        ))
+
+    def test_plans_not_counted_as_request_queries(self):
+        metrics.reset()
+        with self.settings(METRICS_SLOW_QUERY_MS=0,
+                           METRICS_SLOW_QUERY_LOG=self.log):
+            with CaptureQueriesContext(connection) as captured, \
+                    self.assertLogs('core.slow_queries', 'WARNING'):
+                self.client.get(reverse('posts:follow_index'))
+        stats = metrics.snapshot()['views']['posts:follow_index']
+        self.assertEqual(stats['queries_per_request'], len(captured))
+        self.assertFalse(any(
+            query['sql'].startswith('EXPLAIN') for query in captured
+        ))
+        self.assertTrue(any(
+            entry['plan'] for entry in slow_queries.read(self.log)
+        ))
+
+    def test_report_command(self):
+        with self.settings(METRICS_SLOW_QUERY_MS=0,
+                           METRICS_SLOW_QUERY_LOG=self.log), \
+                self.assertLogs('core.slow_queries', 'WARNING') as logs:
+            Post.objects.count()
+        self.assertIn('Медленный запрос', logs.output[0])
+        out = StringIO()
+        call_command('slow_queries', log=self.log, clear=True, stdout=out)
+        self.assertIn('COUNT(*)', out.getvalue())
+        self.assertFalse(os.path.exists(self.log))
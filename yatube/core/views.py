@@ -1,5 +1,9 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from . import metrics
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -14,4 +18,12 @@ def permission_denied(request, exception):
 
 
 def csrf_failure(request, reason=''):
-    return render(request, 'core/403csrf.html')
\ No newline at end of file
+    return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def request_metrics(request):
+    """Сводка метрик запросов этого процесса."""
+    return JsonResponse(
+        metrics.snapshot(), json_dumps_params={'ensure_ascii': False}
+    )
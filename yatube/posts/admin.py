@@ -1,8 +1,23 @@
+from django import forms
 from django.contrib import admin
+
+from posts import search, uploads
+from posts.forms import PostImageField, UploadLimitMixin
 from posts.models import Group, Post
 
 
+class PostAdminForm(UploadLimitMixin, forms.ModelForm):
+    # Картинка проверяется так же, как в форме на сайте.
+    class Meta:
+        model = Post
+        fields = '__all__'
+        field_classes = {
+            'image': PostImageField,
+        }
+
+
 class PostAdmin(admin.ModelAdmin):
+    form = PostAdminForm
     list_display = (
         'pk',
         'text',
@@ -15,6 +30,18 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        form.oversized = uploads.oversized(request)
+        return form
+
+    def get_search_results(self, request, queryset, search_term):
+        # Тот же полнотекстовый индекс, что и у поиска на сайте.
+        words = search.terms(search_term)
+        if not words or not search.enabled():
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(id__in=search.matching_ids(words)), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
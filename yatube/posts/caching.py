@@ -0,0 +1,155 @@
+"""Кэш страниц с отслеживанием зависимостей.
+
+Во время отрисовки view объявляет, от чего зависит страница:
+depends_on(request, 'post:1', 'author:2'). У каждой такой метки в кэше
+хранится версия. Страница кэшируется вместе с версиями своих меток,
+а при чтении версии сверяются с текущими. Сигналы Post, Comment,
+Group и Follow заменяют версии затронутых меток (invalidate), после
+чего устаревшими становятся ровно те страницы, которые от них зависят.
+Поэтому TTL можно держать часами, а правки видны сразу.
+"""
+import hashlib
+import uuid
+from functools import partial, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from core import metrics
+
+PAGE_TIMEOUT = 60 * 60
+
+
+def page_timeout():
+    return getattr(settings, 'POSTS_CACHE_TIMEOUT', PAGE_TIMEOUT)
+
+
+def _tag_key(tag):
+    return f'posts:tag:{tag}'
+
+
+def tag_versions(tags):
+    """Текущие версии меток; отсутствующим назначаются новые."""
+    keys = {_tag_key(tag): tag for tag in tags}
+    found = cache.get_many(keys)
+    missing = {
+        key: uuid.uuid4().hex for key in keys if key not in found
+    }
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {keys[key]: version for key, version in found.items()}
+
+
+def _bump(tags):
+    cache.set_many({_tag_key(tag): uuid.uuid4().hex for tag in tags}, None)
+
+
+def invalidate(*tags):
+    """Делает устаревшими все страницы, зависящие от меток.
+
+    Внутри транзакции версии меняются ещё раз после commit: иначе
+    параллельный запрос успеет закэшировать старые данные под новой
+    версией.
+    """
+    tags = set(tags)
+    _bump(tags)
+    if connection.in_atomic_block:
+        transaction.on_commit(partial(_bump, tags))
+
+
+def depends_on(request, *tags):
+    """Отмечает зависимость страницы от меток и возвращает их версию.
+
+    Версия — строка, которую удобно добавить к ключу фрагмента
+    в {% cache %}.
+    """
+    versions = _remember(request, tag_versions(tags))
+    return '.'.join(versions[tag] for tag in tags)
+
+
+def depends_on_posts(request, posts):
+    """depends_on для карточек постов одним обращением к кэшу.
+
+    Каждому посту проставляется cache_version — версия его собственных
+    меток, чтобы новый пост на странице не сбрасывал чужие карточки.
+    """
+    posts = list(posts)
+    card_tags = {post.pk: post_tags(post, post.group_id)[1:] for post in posts}
+    versions = _remember(request, tag_versions(
+        {tag for tags in card_tags.values() for tag in tags}
+    ))
+    for post in posts:
+        post.cache_version = '.'.join(
+            versions[tag] for tag in card_tags[post.pk]
+        )
+
+
+def _remember(request, versions):
+    if not hasattr(request, '_cache_tags'):
+        request._cache_tags = {}
+    request._cache_tags.update(versions)
+    return versions
+
+
+def post_tags(post, *group_ids):
+    """Метки страниц, на которых показан пост."""
+    return ['posts', f'post:{post.pk}', f'author:{post.author_id}'] + [
+        f'group:{group_id}' for group_id in group_ids if group_id is not None
+    ]
+
+
+def _csrf_cookie(request):
+    return request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+
+
+def _page_key(request):
+    # CSRF-токен в форме годится только для cookie своего браузера.
+    if request.user.is_authenticated:
+        audience = f'{request.user.pk}.{_csrf_cookie(request)}'
+    else:
+        audience = '0'
+    raw = f'{request.get_full_path()}:{audience}'
+    return f'posts:page:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def _cacheable(request, response):
+    if response.status_code != 200 or response.cookies:
+        return False
+    # Без cookie клиент не получит свою копию CSRF-секрета из кэша.
+    return not (
+        request.META.get('CSRF_COOKIE_USED') and not _csrf_cookie(request)
+    )
+
+
+def cache_tagged(view=None, authenticated=True):
+    """Кэширует ответ view, пока не изменится ни одна из его меток.
+
+    С authenticated=False целиком кэшируется только страница для гостей:
+    авторизованным она собирается заново из общих фрагментов и
+    персональных частей (шапка, ссылки на редактирование).
+    """
+    if view is None:
+        return partial(cache_tagged, authenticated=authenticated)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET' or (
+            not authenticated and request.user.is_authenticated
+        ):
+            return view(request, *args, **kwargs)
+        key = _page_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            response, versions = entry
+            if tag_versions(versions) == versions:
+                metrics.count('page_cache_hit')
+                return response
+        metrics.count('page_cache_miss')
+        response = view(request, *args, **kwargs)
+        versions = getattr(request, '_cache_tags', None)
+        if versions and _cacheable(request, response):
+            cache.set(key, (response, versions), page_timeout())
+        return response
+    return wrapper
@@ -0,0 +1,81 @@
+"""Условные GET-запросы (ETag) для лент и постов.
+
+ETag собирается из версий тех же меток кэша, от которых зависит
+страница (см. posts.caching). Метки области находятся запросом по
+уникальному ключу (или вовсе без запроса у главной), а версии — одним
+обращением к кэшу, так что ответ 304 уходит без отрисовки шаблона
+и без запроса страницы.
+
+Last-Modified не отдаётся: дата последнего поста не меняется при
+правке и удалении, а версии меток меняются.
+"""
+import hashlib
+
+from django.conf import settings
+from django.views.decorators.http import condition
+
+from . import following
+from .caching import tag_versions
+from .models import Group, Post, User
+
+
+def index_state():
+    return ['posts']
+
+
+def group_state(slug):
+    pk = Group.objects.filter(slug=slug).values_list('pk', flat=True).first()
+    if pk is None:
+        return None
+    return [f'group:{pk}']
+
+
+def author_state(username):
+    pk = User.objects.filter(
+        username=username
+    ).values_list('pk', flat=True).first()
+    if pk is None:
+        return None
+    return [f'author:{pk}']
+
+
+def post_state(post_id):
+    row = Post.objects.filter(pk=post_id).values_list(
+        'author_id', 'group_id'
+    ).first()
+    if row is None:
+        return None
+    author_id, group_id = row
+    return [f'post:{post_id}', f'author:{author_id}', f'group:{group_id}']
+
+
+def conditional(state):
+    """condition() с валидаторами из функции состояния области.
+
+    state получает аргументы URL и возвращает метки области или None,
+    если объекта нет — тогда view отработает сама и вернёт 404.
+    """
+    def decorator(view):
+        def get_state(request, kwargs):
+            if not hasattr(request, '_conditional_state'):
+                request._conditional_state = state(**kwargs)
+            return request._conditional_state
+
+        def etag(request, *args, **kwargs):
+            current = get_state(request, kwargs)
+            if current is None:
+                return None
+            tags = list(current)
+            if request.user.is_authenticated:
+                # Кнопки подписки зависят от подписок того, кто смотрит.
+                tags.append(following.tag(request.user.pk))
+            versions = tag_versions(tags)
+            # Страница зависит и от того, кто смотрит: шапка, CSRF-токен.
+            parts = [versions[tag] for tag in sorted(versions)] + [
+                str(request.user.pk),
+                request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+            ]
+            return hashlib.md5(':'.join(parts).encode()).hexdigest()
+
+        return condition(etag_func=etag)(view)
+    return decorator
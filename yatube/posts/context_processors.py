@@ -0,0 +1,16 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import following
+
+
+def following_ids(request):
+    """Ленивое множество id авторов, на которых подписан пользователь.
+
+    Загружается, только если шаблон к нему обратился:
+    {% if post.author_id in following_ids %}.
+    """
+    return {
+        'following_ids': SimpleLazyObject(
+            lambda: following.for_request(request)
+        ),
+    }
@@ -0,0 +1,119 @@
+"""Счётчики постов, комментариев и подписок.
+
+Счётчики автора и группы хранятся в колонках Profile, Group и Post и
+сдвигаются атомарным UPDATE ... SET n = n ± 1 из сигналов, поэтому
+чтение не стоит ни одного запроса. Общее число постов живёт в кэше и
+раз в COUNT_TIMEOUT пересчитывается из базы. Полная пересборка —
+recount() или manage.py recount_counters.
+"""
+from django.core.cache import cache
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Group, Post, Profile, User
+
+COUNT_TIMEOUT = 60 * 60
+ALL_POSTS_KEY = 'posts:count:all'
+
+
+def posts_count():
+    """Количество постов на сайте."""
+    count = cache.get(ALL_POSTS_KEY)
+    if count is None:
+        count = Post.objects.count()
+        cache.add(ALL_POSTS_KEY, count, COUNT_TIMEOUT)
+    return count
+
+
+def _shift(queryset, field, delta):
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gt': 0})
+    queryset.update(**{field: F(field) + delta})
+
+
+def _shift_cached(delta):
+    try:
+        cache.incr(ALL_POSTS_KEY, delta)
+    except ValueError:
+        # Счётчика нет в кэше — он будет посчитан при следующем чтении.
+        pass
+
+
+def _shift_group(group_id, delta):
+    if group_id is not None:
+        _shift(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def _shift_post(post, delta):
+    _shift_cached(delta)
+    _shift(Profile.objects.filter(user_id=post.author_id), 'posts_count',
+           delta)
+    _shift_group(post.group_id, delta)
+
+
+def post_added(post):
+    _shift_post(post, 1)
+
+
+def post_removed(post):
+    _shift_post(post, -1)
+
+
+def post_moved(old_group_id, new_group_id):
+    _shift_group(old_group_id, -1)
+    _shift_group(new_group_id, 1)
+
+
+def _shift_comment(comment, delta):
+    _shift(Post.objects.filter(pk=comment.post_id), 'comments_count', delta)
+    _shift(Profile.objects.filter(user_id=comment.author_id),
+           'comments_count', delta)
+
+
+def comment_added(comment):
+    _shift_comment(comment, 1)
+
+
+def comment_removed(comment):
+    _shift_comment(comment, -1)
+
+
+def _shift_follow(follow, delta):
+    _shift(Profile.objects.filter(user_id=follow.author_id),
+           'followers_count', delta)
+    _shift(Profile.objects.filter(user_id=follow.user_id),
+           'following_count', delta)
+
+
+def follow_added(follow):
+    _shift_follow(follow, 1)
+
+
+def follow_removed(follow):
+    _shift_follow(follow, -1)
+
+
+def _count(model, field, outer):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef(outer)})
+        .order_by().values(field).annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def recount():
+    """Пересобирает все счётчики из базы, по одному UPDATE на таблицу."""
+    Profile.objects.bulk_create(
+        Profile(user_id=pk) for pk in User.objects.filter(
+            profile__isnull=True
+        ).values_list('pk', flat=True).iterator()
+    )
+    Profile.objects.update(
+        posts_count=_count(Post, 'author', 'user_id'),
+        comments_count=_count(Comment, 'author', 'user_id'),
+        followers_count=_count(Follow, 'author', 'user_id'),
+        following_count=_count(Follow, 'user', 'user_id'),
+    )
+    Group.objects.update(posts_count=_count(Post, 'group', 'pk'))
+    Post.objects.update(comments_count=_count(Comment, 'post', 'pk'))
+    cache.set(ALL_POSTS_KEY, Post.objects.count(), COUNT_TIMEOUT)
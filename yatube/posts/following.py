@@ -0,0 +1,56 @@
+"""Множество авторов, на которых подписан пользователь.
+
+Кнопки подписки рисуются у каждого автора в лентах и комментариях,
+поэтому множество загружается одним запросом на запрос пользователя,
+а между запросами живёт в кэше FOLLOWING_TIMEOUT секунд. Сигналы Follow
+удаляют его из кэша и меняют версию метки following:<id>, так что
+страницы и ETag, которые его показывали, сразу устаревают.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from . import caching
+from .models import Follow
+
+FOLLOWING_TIMEOUT = 5 * 60
+
+
+def _key(user_id):
+    return f'posts:following:{user_id}'
+
+
+def tag(user_id):
+    return f'following:{user_id}'
+
+
+def author_ids(user):
+    """id авторов, на которых подписан user, из кэша или одним запросом."""
+    if not user.is_authenticated:
+        return frozenset()
+    ids = cache.get(_key(user.pk))
+    if ids is None:
+        ids = frozenset(Follow.objects.filter(
+            user_id=user.pk
+        ).values_list('author_id', flat=True))
+        cache.set(
+            _key(user.pk), ids,
+            getattr(settings, 'POSTS_FOLLOWING_TIMEOUT', FOLLOWING_TIMEOUT),
+        )
+    return ids
+
+
+def for_request(request):
+    """author_ids() текущего пользователя, один раз за запрос.
+
+    Страница, которая их показала, зависит от метки following:<id>.
+    """
+    if not hasattr(request, '_following_ids'):
+        request._following_ids = author_ids(request.user)
+        if request.user.is_authenticated:
+            caching.depends_on(request, tag(request.user.pk))
+    return request._following_ids
+
+
+def changed(user_id):
+    cache.delete(_key(user_id))
+    caching.invalidate(tag(user_id))
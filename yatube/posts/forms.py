@@ -1,12 +1,49 @@
 from django import forms
 
+from . import uploads
 from .models import Post, Comment
 
 
-class PostForm(forms.ModelForm):
+class PostImageField(forms.ImageField):
+    """Картинка, проверенная по заголовку и уменьшенная до предела."""
+
+    def to_python(self, data):
+        if not data:
+            return super().to_python(data)
+        image_format, size, frames = uploads.inspect(data)
+        return super().to_python(
+            uploads.fit(data, image_format, size, frames)
+        )
+
+
+class UploadLimitMixin:
+    """Ошибка у полей, файлы которых отброшены из-за размера.
+
+    Имена полей берутся из uploads.oversized(request): их передают
+    в oversized при создании формы или задают атрибутом класса.
+    """
+
+    oversized = frozenset()
+
+    def __init__(self, *args, oversized=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if oversized is not None:
+            self.oversized = oversized
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for name in self.oversized & set(self.fields):
+            self.add_error(name, uploads.too_large())
+        return cleaned_data
+
+
+class PostForm(UploadLimitMixin, forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
+        field_classes = {
+            'image': PostImageField,
+        }
         labels = {
             'text': 'Текст поста',
             'group': 'Выбор группы для поста',
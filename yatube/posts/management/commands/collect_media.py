@@ -0,0 +1,62 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from sorl.thumbnail import delete
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import Post
+
+MIN_AGE = 60 * 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов, на которые не ссылается ни один пост, '
+        'вместе с их миниатюрами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=MIN_AGE,
+            help='Не трогать файлы моложе стольких секунд: их пост '
+                 'может быть ещё не сохранён.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено.',
+        )
+
+    def files(self, storage, directory):
+        directories, files = storage.listdir(directory)
+        for name in files:
+            yield posixpath.join(directory, name)
+        for subdirectory in directories:
+            yield from self.files(
+                storage, posixpath.join(directory, subdirectory)
+            )
+
+    def handle(self, *args, min_age, dry_run, **options):
+        field = Post._meta.get_field('image')
+        storage = field.storage
+        directory = field.upload_to.rstrip('/')
+        if not storage.exists(directory):
+            return
+        referenced = set(
+            Post.objects.exclude(image='').exclude(image=None)
+            .values_list('image', flat=True).iterator()
+        )
+        cutoff = timezone.now() - timedelta(seconds=min_age)
+        removed = 0
+        for name in self.files(storage, directory):
+            if name in referenced or storage.get_modified_time(name) > cutoff:
+                continue
+            removed += 1
+            if dry_run:
+                self.stdout.write(name)
+                continue
+            # Удаляет файл, его миниатюры и записи о них в хранилище sorl.
+            delete(ImageFile(name, storage))
+        verb = 'Без ссылок' if dry_run else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(f'{verb} файлов: {removed}'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Выгружает группы, посты, комментарии или подписки в NDJSON/CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(transfer.SPECS))
+        parser.add_argument(
+            '--format', dest='fmt', choices=transfer.FORMATS,
+            default='ndjson',
+        )
+        parser.add_argument(
+            '--output', default='-', help='Файл; по умолчанию stdout.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=transfer.CHUNK_SIZE,
+        )
+
+    def handle(self, *args, name, fmt, output, chunk_size, **options):
+        rows = transfer.export_rows(name, chunk_size=chunk_size)
+        fields = transfer.SPECS[name].fields
+        if output == '-':
+            written = transfer.write(rows, self.stdout, fmt, fields)
+        else:
+            with open(output, 'w', newline='', encoding='utf-8') as stream:
+                written = transfer.write(rows, stream, fmt, fields)
+        self.stderr.write(f'{name}: выгружено {written}')
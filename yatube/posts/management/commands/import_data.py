@@ -0,0 +1,59 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает группы, посты, комментарии или подписки из NDJSON/CSV '
+        'пачками через bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(transfer.SPECS))
+        parser.add_argument('path', help='Файл или - для stdin.')
+        parser.add_argument(
+            '--format', dest='fmt', choices=transfer.FORMATS,
+            default='ndjson',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=transfer.BATCH_SIZE,
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать сначала, не глядя на контрольную точку.',
+        )
+        parser.add_argument(
+            '--skip-rebuild', action='store_true',
+            help='Не пересобирать счётчики, индекс и ленты (если дальше '
+                 'будут ещё загрузки).',
+        )
+
+    def handle(self, *args, name, path, fmt, batch_size, restart,
+               skip_rebuild, **options):
+        def progress(done):
+            self.stderr.write(f'\r{name}: {done}', ending='')
+
+        checkpoint = transfer.Checkpoint(
+            None if path == '-' else f'{path}.checkpoint'
+        )
+        if restart:
+            checkpoint.clear()
+        if path == '-':
+            done = transfer.load(
+                name, transfer.read(sys.stdin, fmt),
+                batch_size=batch_size, progress=progress,
+            )
+        else:
+            with open(path, newline='', encoding='utf-8') as stream:
+                done = transfer.load(
+                    name, transfer.read(stream, fmt),
+                    batch_size=batch_size, checkpoint=checkpoint,
+                    progress=progress,
+                )
+        self.stderr.write('')
+        if not skip_rebuild:
+            transfer.rebuild_derived()
+        self.stdout.write(self.style.SUCCESS(f'{name}: загружено {done}'))
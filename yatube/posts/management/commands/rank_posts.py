@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts import ranking
+
+
+class Command(BaseCommand):
+    help = ('Обновляет оценки постов для ленты популярного '
+            '(запускать периодически, например раз в 5 минут).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать оценки всех постов с нуля.',
+        )
+
+    def handle(self, *args, full, **options):
+        added, updated = (ranking.rebuild if full else ranking.update)()
+        self.stdout.write(
+            f'Новых постов: {added}, постов с новыми событиями: {updated}'
+        )
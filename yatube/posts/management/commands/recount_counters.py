@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import counts
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок.'
+
+    def handle(self, *args, **options):
+        counts.recount()
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рекомендации «На кого подписаться» '
+            '(по умолчанию — только для изменивших подписки).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать для всех пользователей.',
+        )
+        parser.add_argument('--top', type=int, default=suggestions.TOP)
+        parser.add_argument(
+            '--batch-size', type=int, default=suggestions.BATCH_SIZE,
+        )
+
+    def handle(self, *args, full, top, batch_size, **options):
+        def progress(done):
+            self.stderr.write(f'пользователей: {done}')
+
+        users, stored = suggestions.refresh(
+            full=full, top=top, batch_size=batch_size, progress=progress
+        )
+        self.stdout.write(f'Пользователей: {users}, рекомендаций: {stored}')
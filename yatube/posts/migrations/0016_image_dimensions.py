@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:33
+
+from django.core.files.images import get_image_dimensions
+from django.db import migrations, models
+
+
+def fill_dimensions(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    for post in Post.objects.exclude(image='').exclude(image=None).iterator():
+        try:
+            width, height = get_image_dimensions(post.image)
+        except OSError:
+            continue
+        Post.objects.filter(pk=post.pk).update(
+            image_width=width, image_height=height
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_timeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='Высота картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='Ширина картинки'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, height_field='image_height', null=True, upload_to='posts/', verbose_name='Картинка', width_field='image_width'),
+        ),
+        migrations.RunPython(fill_dimensions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:36
+
+from django.db import migrations, models
+import posts.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, height_field='image_height', null=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка', width_field='image_width'),
+        ),
+    ]
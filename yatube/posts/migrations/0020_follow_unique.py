@@ -0,0 +1,54 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def drop_duplicates(apps, schema_editor):
+    """Оставляет по одной подписке на пару и пересчитывает счётчики."""
+    Follow = apps.get_model('posts', 'Follow')
+    Profile = apps.get_model('posts', 'Profile')
+    duplicates = Follow.objects.values('user_id', 'author_id').annotate(
+        keep=models.Min('id'), total=models.Count('id')
+    ).filter(total__gt=1)
+    for row in duplicates.iterator():
+        Follow.objects.filter(
+            user_id=row['user_id'], author_id=row['author_id']
+        ).exclude(pk=row['keep']).delete()
+        for field, user_id, key in (
+            ('following_count', row['user_id'], 'user_id'),
+            ('followers_count', row['author_id'], 'author_id'),
+        ):
+            Profile.objects.filter(user_id=user_id).update(**{
+                field: Follow.objects.filter(**{key: user_id}).count()
+            })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_post_fts'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='follow',
+            name='author',
+            field=models.ForeignKey(db_index=False, help_text='Имя автора', on_delete=django.db.models.deletion.CASCADE, related_name='following', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='follower', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['author', 'user'], name='follow_author_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_suggestions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=20, unique=True, verbose_name='Источник')),
+                ('last_id', models.BigIntegerField(default=0, verbose_name='Последний id')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PostRank',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='posts.Post', verbose_name='Пост')),
+                ('score', models.FloatField(verbose_name='Оценка')),
+                ('group', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='posts.Group', verbose_name='Группа')),
+            ],
+            options={
+                'verbose_name': 'Оценка поста',
+                'verbose_name_plural': 'Оценки постов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='postrank',
+            index=models.Index(fields=['-score', '-post'], name='rank_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postrank',
+            index=models.Index(fields=['group', '-score', '-post'], name='rank_group_score_idx'),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models.signals import post_delete, post_save
+
+from .storage import post_images
 
 User = get_user_model()
 
@@ -11,6 +14,9 @@ class Group(models.Model):
     slug = models.SlugField(unique=True)
     description = models.TextField(verbose_name='Описание',
                                    blank=True, null=True)
+    posts_count = models.PositiveIntegerField(
+        'Количество постов', default=0, editable=False
+    )
 
     def __str__(self) -> str:
         return self.title
@@ -40,8 +46,20 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=post_images,
         blank=True,
-        null=True
+        null=True,
+        width_field='image_width',
+        height_field='image_height',
+    )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, editable=False
+    )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев', default=0, editable=False
     )
 
     class Meta:
@@ -75,22 +93,254 @@ class Comment(models.Model):
 
     )
 
+    class Meta:
+        indexes = [
+            # Страница комментариев поста по курсору (created, id).
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.text[:LENGTH_TEXT]
 
 
+class FollowManager(models.Manager):
+    """Подписки и отписки одним запросом на пару без гонок.
+
+    Строка вставляется INSERT с пропуском конфликта по уникальной паре
+    (user, author) и удаляется одним DELETE; изменилась ли строка,
+    видно по rowcount. Сигналы post_save и post_delete отправляются
+    только при реальном изменении, как их отправил бы сам Django.
+    """
+
+    def follow(self, user_id, author_id):
+        """Подписывает; False, если подписка уже была или это сам автор."""
+        if user_id == author_id:
+            return False
+        db = router.db_for_write(self.model)
+        ops = connections[db].ops
+        table = self.model._meta.db_table
+        sql = (
+            f'{ops.insert_statement(ignore_conflicts=True)} {table} '
+            f'(user_id, author_id) VALUES (%s, %s) '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+        )
+        with connections[db].cursor() as cursor:
+            cursor.execute(sql, [user_id, author_id])
+            if cursor.rowcount != 1:
+                return False
+            pk = ops.last_insert_id(cursor, table, 'id')
+        follow = self.model(pk=pk, user_id=user_id, author_id=author_id)
+        follow._state.adding = False
+        follow._state.db = db
+        post_save.send(sender=self.model, instance=follow, created=True,
+                       update_fields=None, raw=False, using=db)
+        return True
+
+    def unfollow(self, user_id, author_id):
+        """Отписывает; False, если подписки не было."""
+        db = router.db_for_write(self.model)
+        table = self.model._meta.db_table
+        with connections[db].cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE user_id = %s AND author_id = %s',
+                [user_id, author_id],
+            )
+            if cursor.rowcount != 1:
+                return False
+        follow = self.model(user_id=user_id, author_id=author_id)
+        post_delete.send(sender=self.model, instance=follow, using=db)
+        return True
+
+    def follow_many(self, user_id, author_ids):
+        """Подписывает на всех авторов в одной транзакции.
+
+        Возвращает id авторов, подписка на которых появилась.
+        """
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            return [author_id for author_id in dict.fromkeys(author_ids)
+                    if self.follow(user_id, author_id)]
+
+    def unfollow_many(self, user_id, author_ids):
+        """Отписывает от всех авторов в одной транзакции."""
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            return [author_id for author_id in dict.fromkeys(author_ids)
+                    if self.unfollow(user_id, author_id)]
+
+
 class Follow(models.Model):
+    # Индексы по одному полю не нужны: их заменяют составные ниже.
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='follower',
-        verbose_name='Подписчик'
+        verbose_name='Подписчик',
+        db_index=False,
     )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='following',
         verbose_name='Автор',
-        help_text='Имя автора'
+        help_text='Имя автора',
+        db_index=False,
     )
 
+    objects = FollowManager()
+
+    class Meta:
+        constraints = [
+            # Подписки пользователя: (user, author) — индекс этой пары.
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'
+            ),
+        ]
+        indexes = [
+            # Подписчики автора.
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'
+            ),
+            # Страницы подписчиков и подписок по курсору на id.
+            models.Index(
+                fields=['author', '-id'], name='follow_author_id_idx'
+            ),
+            models.Index(fields=['user', '-id'], name='follow_user_id_idx'),
+        ]
+
+
+class Profile(models.Model):
+    """Счётчики пользователя, которые поддерживаются при записи."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='profile',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    comments_count = models.PositiveIntegerField('Комментариев', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    # Подписки изменились после последнего расчёта рекомендаций.
+    suggestions_stale = models.BooleanField(
+        'Пересчитать рекомендации', default=True, db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'Профиль'
+        verbose_name_plural = 'Профили'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписчика."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_post'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'], name='timeline_user_author_idx'
+            ),
+        ]
+
+
+class Suggestion(models.Model):
+    """Автор, на которого пользователю стоит подписаться."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='suggestions',
+        verbose_name='Пользователь',
+        db_index=False,
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    score = models.FloatField('Оценка')
+
+    class Meta:
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_suggestion'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-score'], name='suggestion_user_score_idx'
+            ),
+        ]
+
+
+class PostRank(models.Model):
+    """Оценка поста для ленты популярного (см. posts.ranking)."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ranking',
+        verbose_name='Пост'
+    )
+    # Копия Post.group_id: лента группы читается по одному индексу.
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+        verbose_name='Группа',
+        db_index=False,
+    )
+    score = models.FloatField('Оценка')
+
+    class Meta:
+        verbose_name = 'Оценка поста'
+        verbose_name_plural = 'Оценки постов'
+        indexes = [
+            models.Index(fields=['-score', '-post'], name='rank_score_idx'),
+            models.Index(
+                fields=['group', '-score', '-post'],
+                name='rank_group_score_idx'
+            ),
+        ]
+
+
+class RankWatermark(models.Model):
+    """До какого id события уже учтены в оценках постов."""
+    source = models.CharField('Источник', max_length=20, unique=True)
+    last_id = models.BigIntegerField('Последний id', default=0)
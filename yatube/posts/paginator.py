@@ -0,0 +1,227 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, InvalidPage, Page, Paginator
+from django.db.models import Q
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+def encode_cursor(number, values):
+    """Упаковывает номер страницы и значения ключа в непрозрачный токен."""
+    payload = [number] + [
+        value.isoformat() if isinstance(value, datetime.datetime) else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен в номер страницы и сырые значения ключа."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor('Некорректный курсор')
+    if not isinstance(payload, list) or len(payload) < 2:
+        raise InvalidCursor('Некорректный курсор')
+    number, values = payload[0], payload[1:]
+    if not isinstance(number, int) or number < 1:
+        raise InvalidCursor('Некорректный курсор')
+    return number, values
+
+
+class KeysetPage(Page):
+    """Страница, которая знает курсоры соседних страниц."""
+
+    def __init__(self, object_list, number, paginator,
+                 next_cursor=None, previous_cursor=None):
+        super().__init__(object_list, number, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def page_window(self):
+        """Текущая страница и соседние, до которых можно дойти курсором.
+
+        Дальние номера открывались бы через OFFSET, поэтому их нет:
+        для них в шаблоне есть ссылки на первую и последнюю страницу.
+        """
+        window = [self.number]
+        if self.has_previous():
+            window.insert(0, self.number - 1)
+        if self.has_next():
+            window.append(self.number + 1)
+        return window
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+    def start_index(self):
+        if not self.object_list:
+            return 0
+        return (self.number - 1) * self.paginator.per_page + 1
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1
+
+
+class KeysetPaginator(Paginator):
+    """Паджинатор по ключу сортировки вместо OFFSET.
+
+    Следующая страница выбирается условием «ключ меньше последнего
+    на текущей странице», поэтому стоимость запроса не зависит от того,
+    насколько далеко листает пользователь. Ключ должен быть уникальным,
+    поэтому последним полем всегда идёт первичный ключ.
+
+    Количество записей паджинатор сам не считает: его можно передать
+    в ``count`` (например, из posts.counts), иначе номера страниц
+    вокруг текущей и ссылка на последнюю страницу не показываются.
+
+    Старые ссылки ?page=N открываются через OFFSET, поэтому номера
+    больше offset_limit не открываются (кроме последней страницы):
+    дальше листают только курсорами. Страница без записей — EmptyPage.
+    """
+
+    offset_limit = 10
+
+    def __init__(self, object_list, per_page, keys=('-pub_date', '-id'),
+                 count=None, **kwargs):
+        self.keys = tuple(keys)
+        self.fields = [key.lstrip('-') for key in self.keys]
+        self.descending = self.keys[0].startswith('-')
+        self.has_count = count is not None
+        if self.has_count:
+            self.count = count
+        super().__init__(object_list.order_by(*self.keys), per_page, **kwargs)
+
+    def get_page(self, number=None, after=None, before=None):
+        """Возвращает страницу по курсору, а без него — по номеру."""
+        try:
+            if after:
+                return self._page_after(*decode_cursor(after))
+            if before:
+                return self._page_before(*decode_cursor(before))
+        except InvalidCursor:
+            return self._first_page()
+        if number == 'last' and self.has_count:
+            return self._last_page()
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            number = 1
+        if number > 1:
+            return self._offset_page(number)
+        return self._first_page()
+
+    def _key(self, obj):
+        return [getattr(obj, field) for field in self.fields]
+
+    def _to_python(self, values):
+        if len(values) != len(self.fields):
+            raise InvalidCursor('Некорректный курсор')
+        converted = []
+        annotations = self.object_list.query.annotations
+        for field, value in zip(self.fields, values):
+            if field in annotations:
+                model_field = annotations[field].output_field
+            else:
+                model_field = self.object_list.model._meta.get_field(field)
+            try:
+                converted.append(model_field.to_python(value))
+            except ValidationError:
+                raise InvalidCursor('Некорректный курсор')
+        return converted
+
+    def _seek(self, values, forward):
+        """Условие «строго после» (или «строго до») значения ключа."""
+        lookup = 'lt' if forward == self.descending else 'gt'
+        condition = Q()
+        for position, field in enumerate(self.fields):
+            step = Q(**{f'{field}__{lookup}': values[position]})
+            for previous, value in zip(self.fields[:position], values):
+                step &= Q(**{previous: value})
+            condition |= step
+        return condition
+
+    def _reversed_keys(self):
+        return [
+            key[1:] if key.startswith('-') else f'-{key}' for key in self.keys
+        ]
+
+    def _build(self, rows, number, has_next, has_previous):
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor(number + 1, self._key(rows[-1]))
+        if rows and has_previous:
+            previous_cursor = encode_cursor(number - 1, self._key(rows[0]))
+        return KeysetPage(
+            rows, number, self,
+            next_cursor=next_cursor,
+            previous_cursor=previous_cursor,
+        )
+
+    def _fetch(self, queryset):
+        rows = list(queryset[:self.per_page + 1])
+        return rows[:self.per_page], len(rows) > self.per_page
+
+    def _first_page(self):
+        rows, has_next = self._fetch(self.object_list)
+        return self._build(rows, 1, has_next, False)
+
+    def _last_page(self):
+        number = self.num_pages
+        size = self.count - (number - 1) * self.per_page
+        if number == 1 or size <= 0:
+            return self._first_page()
+        rows = list(
+            self.object_list.order_by(*self._reversed_keys())[:size]
+        )
+        rows.reverse()
+        return self._build(rows, number, False, True)
+
+    def _offset_page(self, number):
+        # Обратная совместимость со ссылками вида ?page=N.
+        if self.has_count and number >= self.num_pages:
+            return self._last_page()
+        if number > self.offset_limit:
+            raise EmptyPage('Номер страницы больше offset_limit')
+        bottom = (number - 1) * self.per_page
+        rows, has_next = self._fetch(self.object_list[bottom:])
+        if not rows:
+            raise EmptyPage('Страница за концом списка')
+        return self._build(rows, number, has_next, True)
+
+    def _page_after(self, number, values):
+        queryset = self.object_list.filter(
+            self._seek(self._to_python(values), forward=True)
+        )
+        rows, has_next = self._fetch(queryset)
+        if not rows:
+            raise EmptyPage('Курсор за концом списка')
+        return self._build(rows, number, has_next, number > 1)
+
+    def _page_before(self, number, values):
+        queryset = self.object_list.filter(
+            self._seek(self._to_python(values), forward=False)
+        ).order_by(*self._reversed_keys())
+        rows, has_previous = self._fetch(queryset)
+        rows.reverse()
+        if not has_previous:
+            number = 1
+        return self._build(rows, number, True, has_previous)
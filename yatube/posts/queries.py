@@ -0,0 +1,88 @@
+"""Запросы для лент и страницы поста.
+
+Каждая выборка заранее подтягивает всё, что потом трогают шаблоны
+(автора, группу), и только нужные колонки, чтобы отрисовка страницы
+не порождала по запросу на пост. Новое поле в шаблоне ленты нужно
+добавить сюда же, иначе тест на число запросов в test_views упадёт.
+"""
+from django.db.models import Exists, OuterRef, Value
+from django.db.models.fields import BooleanField
+
+from . import ranking, timeline
+from .models import Follow, Post
+
+FEED_FIELDS = (
+    'id', 'text', 'pub_date', 'image', 'image_width', 'image_height',
+    'comments_count',
+    'author__id', 'author__username', 'author__first_name',
+    'author__last_name',
+    'group__id', 'group__title', 'group__slug',
+)
+PERSON_FIELDS = ('id', 'username', 'first_name', 'last_name')
+COMMENT_FIELDS = (
+    'id', 'text', 'created', 'post_id',
+    'author__id', 'author__username',
+)
+
+
+def _feed(queryset):
+    return queryset.select_related('author', 'group').only(*FEED_FIELDS)
+
+
+def index_posts():
+    return _feed(Post.objects.all())
+
+
+def group_posts(group):
+    return _feed(group.posts.all())
+
+
+def author_posts(author):
+    return _feed(author.posts.all())
+
+
+def popular_posts():
+    return _feed(ranking.ranked(Post.objects.all()))
+
+
+def group_popular_posts(group):
+    return _feed(ranking.ranked(Post.objects.filter(ranking__group=group)))
+
+
+def follow_posts(user):
+    return _feed(timeline.feed(user))
+
+
+def post_detail():
+    return Post.objects.select_related('group', 'author__profile')
+
+
+def post_comments(post):
+    return post.comments.select_related('author').only(*COMMENT_FIELDS)
+
+
+def _follow_list(queryset, person, viewer):
+    """Подписки с пользователем person и флагом follows_you.
+
+    follows_you — подписан ли person на viewer; считается
+    подзапросом EXISTS по уникальному индексу (user, author) в том же
+    запросе, что и страница.
+    """
+    if viewer.is_authenticated:
+        follows_you = Exists(Follow.objects.filter(
+            user_id=OuterRef(f'{person}_id'), author_id=viewer.pk
+        ))
+    else:
+        follows_you = Value(False, output_field=BooleanField())
+    return queryset.select_related(person).only(
+        'id', 'user_id', 'author_id',
+        *(f'{person}__{field}' for field in PERSON_FIELDS)
+    ).annotate(follows_you=follows_you)
+
+
+def followers(author, viewer):
+    return _follow_list(Follow.objects.filter(author=author), 'user', viewer)
+
+
+def following(user, viewer):
+    return _follow_list(Follow.objects.filter(user=user), 'author', viewer)
@@ -0,0 +1,171 @@
+"""Оценки постов для ленты популярного.
+
+Оценка — сумма весов событий поста (публикация, комментарии, новые
+подписчики автора), каждый из которых со временем затухает вдвое
+за HALF_LIFE. Все оценки затухают с одной скоростью, поэтому их не
+нужно пересчитывать с ходом времени: достаточно хранить логарифм суммы
+весов, умноженных на exp((t - EPOCH) / tau). Новое событие добавляется
+к такой оценке через logaddexp, а порядок постов совпадает с порядком
+по затухшим оценкам на любой момент.
+
+Оценки лежат в PostRank с индексами (-score) и (group, -score), так что
+лента популярного читается так же, как хронологическая. Периодическая
+команда rank_posts учитывает только события, появившиеся после
+прошлого запуска (RankWatermark), и сбрасывает метку кэша popular.
+У подписок нет даты, поэтому подписки, появившиеся до первого запуска
+или пересчёта, не учитываются: их время неизвестно.
+"""
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from . import caching
+from .models import Comment, Follow, Post, PostRank, RankWatermark
+
+HALF_LIFE = timedelta(hours=24)
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+PUBLISH_WEIGHT = 1.0
+COMMENT_WEIGHT = 1.0
+FOLLOW_WEIGHT = 0.5
+# Новый подписчик поднимает посты автора не старше FOLLOW_WINDOW.
+FOLLOW_WINDOW = timedelta(days=7)
+BATCH_SIZE = 1000
+TAG = 'popular'
+
+
+def term(moment, weight):
+    """Логарифм веса события с поправкой на его время."""
+    tau = HALF_LIFE.total_seconds() / math.log(2)
+    return (moment - EPOCH).total_seconds() / tau + math.log(weight)
+
+
+def logaddexp(first, second):
+    high, low = max(first, second), min(first, second)
+    return high + math.log1p(math.exp(low - high))
+
+
+def _watermark(source):
+    watermark, _ = RankWatermark.objects.get_or_create(source=source)
+    return watermark
+
+
+def _rank_new_posts():
+    added = 0
+    last_id = 0
+    new_posts = Post.objects.filter(ranking__isnull=True).order_by(
+        'id'
+    ).values_list('id', 'group_id', 'pub_date')
+    while True:
+        # Продолжение по id: каждая пачка не пересматривает прошлые.
+        rows = list(new_posts.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not rows:
+            return added
+        PostRank.objects.bulk_create(
+            PostRank(post_id=post_id, group_id=group_id,
+                     score=term(pub_date, PUBLISH_WEIGHT))
+            for post_id, group_id, pub_date in rows
+        )
+        added += len(rows)
+        last_id = rows[-1][0]
+
+
+def _apply(terms):
+    """Добавляет события {post_id: [term, ...]} к оценкам постов."""
+    post_ids = list(terms)
+    for start in range(0, len(post_ids), BATCH_SIZE):
+        ranks = list(PostRank.objects.filter(
+            post_id__in=post_ids[start:start + BATCH_SIZE]
+        ))
+        for rank in ranks:
+            for value in terms[rank.post_id]:
+                rank.score = logaddexp(rank.score, value)
+        PostRank.objects.bulk_update(ranks, ['score'])
+
+
+def _new_events(source, queryset, fields):
+    watermark = _watermark(source)
+    rows = list(queryset.filter(id__gt=watermark.last_id).order_by(
+        'id'
+    ).values_list('id', *fields))
+    if rows:
+        watermark.last_id = rows[-1][0]
+        watermark.save(update_fields=['last_id'])
+    return [row[1:] for row in rows]
+
+
+def _comment_terms():
+    terms = defaultdict(list)
+    for post_id, created in _new_events(
+        'comments', Comment.objects.all(), ('post_id', 'created')
+    ):
+        terms[post_id].append(term(created, COMMENT_WEIGHT))
+    return terms
+
+
+def _follow_terms(now):
+    # У подписки нет даты: событием считается момент, когда её увидели.
+    # При первом запуске все прежние подписки пришлись бы на now,
+    # поэтому метка просто ставится на последнюю из них.
+    if not RankWatermark.objects.filter(source='follows').exists():
+        RankWatermark.objects.create(
+            source='follows',
+            last_id=Follow.objects.aggregate(last=Max('id'))['last'] or 0,
+        )
+        return {}
+    new_followers = defaultdict(int)
+    for (author_id,) in _new_events(
+        'follows', Follow.objects.all(), ('author_id',)
+    ):
+        new_followers[author_id] += 1
+    terms = defaultdict(list)
+    recent = Post.objects.filter(
+        author_id__in=list(new_followers),
+        pub_date__gte=now - FOLLOW_WINDOW,
+    ).values_list('id', 'author_id')
+    for post_id, author_id in recent.iterator():
+        terms[post_id].append(
+            term(now, FOLLOW_WEIGHT * new_followers[author_id])
+        )
+    return terms
+
+
+def update(now=None):
+    """Учитывает новые посты и события после прошлого запуска.
+
+    Возвращает число новых постов и число постов с новыми событиями.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        added = _rank_new_posts()
+        terms = _comment_terms()
+        for post_id, values in _follow_terms(now).items():
+            terms[post_id].extend(values)
+        _apply(terms)
+    caching.invalidate(TAG)
+    return added, len(terms)
+
+
+def rebuild(now=None):
+    """Пересчитывает оценки с нуля по всем постам и комментариям."""
+    with transaction.atomic():
+        PostRank.objects.all().delete()
+        RankWatermark.objects.all().delete()
+        return update(now)
+
+
+def post_moved(post_id, group_id):
+    PostRank.objects.filter(post_id=post_id).update(group_id=group_id)
+
+
+def ranked(queryset):
+    """Посты queryset по оценке; ключ паджинатора ('-score', '-rank_post').
+
+    Ключ берётся из PostRank целиком, чтобы порядок шёл по индексу.
+    """
+    return queryset.filter(ranking__isnull=False).annotate(
+        score=F('ranking__score'), rank_post=F('ranking__post'),
+    )
@@ -0,0 +1,91 @@
+"""Полнотекстовый поиск по постам.
+
+На SQLite текст постов лежит в виртуальной таблице FTS5 posts_post_fts
+(rowid — id поста), которую обновляют сигналы Post. Поиск идёт по её
+индексу и ранжируется по bm25, поэтому не зависит от числа постов.
+На других СУБД поиск откатывается к icontains по словам запроса.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+TABLE = 'posts_post_fts'
+WORD = re.compile(r'\w+')
+MAX_TERMS = 10
+
+
+def enabled():
+    return connection.vendor == 'sqlite'
+
+
+def terms(query):
+    return WORD.findall(query or '')[:MAX_TERMS]
+
+
+def match_expression(words):
+    """Запрос MATCH: все слова, последнее — как префикс."""
+    quoted = [f'"{word}"' for word in words]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def index_post(post):
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post.pk])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)',
+            [post.pk, post.text],
+        )
+
+
+def unindex_post(post_id):
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+
+
+def rebuild():
+    """Заново заполняет индекс из posts_post (после bulk_create и т. п.)."""
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text) '
+            'SELECT id, text FROM posts_post'
+        )
+
+
+def matching_ids(words):
+    """Подзапрос id постов, подходящих под слова, для filter(id__in=)."""
+    return RawSQL(
+        f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s',
+        (match_expression(words),),
+    )
+
+
+def search(queryset, query):
+    """Посты из queryset по запросу и ключ сортировки для паджинатора.
+
+    Пустой запрос ничего не находит.
+    """
+    words = terms(query)
+    if not words:
+        return queryset.none(), ('-pub_date', '-id')
+    if not enabled():
+        for word in words:
+            queryset = queryset.filter(text__icontains=word)
+        return queryset, ('-pub_date', '-id')
+    ranked = queryset.extra(
+        tables=[TABLE],
+        where=[f'{TABLE}.rowid = posts_post.id', f'{TABLE} MATCH %s'],
+        params=[match_expression(words)],
+    ).annotate(
+        rank=RawSQL(f'{TABLE}.rank', (), output_field=FloatField())
+    )
+    return ranked, ('rank', 'id')
@@ -0,0 +1,109 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import (caching, counts, following, ranking, search, suggestions,
+               timeline)
+from .models import Comment, Follow, Group, Post, Profile, User
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        Profile.objects.create(user=instance)
+    else:
+        # Имя автора выводится в карточках его постов.
+        caching.invalidate(f'author:{instance.pk}')
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    # Имя пользователя освобождается: страница профиля больше не его.
+    caching.invalidate(f'author:{instance.pk}')
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    """Запоминает прежнюю группу редактируемого поста."""
+    if instance.pk is None:
+        return
+    instance._previous_group_id = (
+        Post.objects.filter(pk=instance.pk)
+        .values_list('group_id', flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    caching.invalidate(*caching.post_tags(
+        instance, instance.group_id, previous_group_id
+    ))
+    search.index_post(instance)
+    if created:
+        counts.post_added(instance)
+        timeline.post_published(instance)
+        return
+    if previous_group_id != instance.group_id:
+        counts.post_moved(previous_group_id, instance.group_id)
+        ranking.post_moved(instance.pk, instance.group_id)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counts.post_removed(instance)
+    search.unindex_post(instance.pk)
+    caching.invalidate(*caching.post_tags(instance, instance.group_id))
+
+
+def _comment_tags(comment):
+    return f'post:{comment.post_id}', f'author:{comment.author_id}'
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counts.comment_added(instance)
+    caching.invalidate(*_comment_tags(instance))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counts.comment_removed(instance)
+    caching.invalidate(*_comment_tags(instance))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        caching.invalidate(f'group:{instance.pk}')
+
+
+def _follow_tags(follow):
+    return f'author:{follow.author_id}', f'author:{follow.user_id}'
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counts.follow_added(instance)
+        timeline.author_followed(instance.user_id, instance.author_id)
+        caching.invalidate(*_follow_tags(instance))
+        following.changed(instance.user_id)
+        suggestions.author_followed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counts.follow_removed(instance)
+    timeline.author_unfollowed(instance.user_id, instance.author_id)
+    caching.invalidate(*_follow_tags(instance))
+    following.changed(instance.user_id)
+    suggestions.mark_stale(instance.user_id)
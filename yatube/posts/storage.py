@@ -0,0 +1,52 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Файл сохраняется под SHA-256 своего содержимого
+(posts/ab/abcdef….jpg), поэтому одинаковые картинки лежат на диске
+один раз, а миниатюры sorl, ключ которых зависит от имени файла,
+создаются для них тоже один раз. Ссылки на файл — это посты с таким
+image: при правке или удалении поста файл не удаляется сразу, его
+забирает команда collect_media, когда ссылок не остаётся.
+"""
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CHUNK_SIZE = 64 * 1024
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage, который называет файлы по их хешу."""
+
+    def digest_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks(CHUNK_SIZE):
+            digest.update(chunk)
+        content.seek(0)
+        hexdigest = digest.hexdigest()
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        return posixpath.join(
+            directory, hexdigest[:2], f'{hexdigest}{extension}'
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.digest_name(name, content)
+        if self.exists(name):
+            # collect_media не трогает свежие файлы: повторное сохранение
+            # продлевает жизнь сироте, пока пост с ней не записан в базу.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+post_images = ContentAddressedStorage()
@@ -0,0 +1,54 @@
+from django import template
+
+from .. import caching, thumbnails
+
+register = template.Library()
+
+SIZES = '(max-width: 960px) 100vw, 960px'
+
+
+@register.inclusion_tag('posts/includes/post_image.html')
+def post_image(post, sizes=SIZES):
+    """Картинка поста с srcset по готовым копиям.
+
+    Пока копии не созданы, выводится оригинал, а недостающие копии
+    ставятся в очередь.
+    """
+    if not post.image:
+        return {}
+    backend = thumbnails.get_backend()
+    by_format = {}
+    missing = []
+    for geometry, options in thumbnails.renditions(post.image_width):
+        thumbnail = backend.lookup(post.image, geometry, **options)
+        if thumbnail:
+            by_format.setdefault(options['format'], []).append(thumbnail)
+        else:
+            missing.append((geometry, options))
+    if missing:
+        thumbnails.schedule(post.image.name, missing,
+                            tags=caching.post_tags(post, post.group_id))
+        return {
+            'src': post.image.url,
+            'width': post.image_width,
+            'height': post.image_height,
+        }
+    sources = [
+        {
+            'type': f'image/{image_format.lower()}',
+            'srcset': ', '.join(
+                f'{image.url} {image.width}w' for image in images
+            ),
+        }
+        for image_format, images in by_format.items()
+    ]
+    fallback = sources.pop()
+    largest = by_format[thumbnails.formats()[-1]][-1]
+    return {
+        'src': largest.url,
+        'srcset': fallback['srcset'],
+        'sizes': sizes,
+        'sources': sources,
+        'width': largest.width,
+        'height': largest.height,
+    }
@@ -1,18 +1,33 @@
+import os
 import shutil
 import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from PIL import Image
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.conf import settings
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from http import HTTPStatus
 
+from .. import caching, thumbnails
 from ..models import Post, Group, Comment
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 User = get_user_model()
 
+
+def image_bytes(size=(4, 2), image_format='GIF'):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'white').save(buffer, image_format)
+    return buffer.getvalue()
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostFormTest(TestCase):
     @classmethod
@@ -83,3 +98,271 @@ class PostFormTest(TestCase):
         self.assertEqual(Post.objects.count(), 1)
         self.assertEqual(len(Post.objects.filter(group=self.group)), 0)
         self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='painter')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_thumbnail_not_rendered_in_request(self):
+        """Пока миниатюры нет, страница показывает оригинал и не ждёт её."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'С картинкой',
+                'image': SimpleUploadedFile(
+                    'small.gif', image_bytes(), content_type='image/gif'
+                ),
+            },
+        )
+        post = Post.objects.get()
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, post.image.url)
+        self.assertContains(response, 'width="4" height="2" loading="lazy"')
+        self.assertFalse(
+            os.path.exists(os.path.join(TEMP_MEDIA_ROOT, 'cache'))
+        )
+
+    @override_settings(POSTS_THUMBNAIL_WORKERS=0,
+                       POSTS_IMAGE_WIDTHS=(320, 640))
+    def test_ready_renditions_rendered_as_picture(self):
+        """Готовые копии выводятся в <picture> с srcset и размерами."""
+        cache.clear()
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'С картинкой',
+                'image': SimpleUploadedFile(
+                    'wide.png', image_bytes((700, 247), 'PNG'),
+                    content_type='image/png'
+                ),
+            },
+        )
+        post = Post.objects.get()
+        self.addCleanup(
+            shutil.rmtree, os.path.join(TEMP_MEDIA_ROOT, 'cache'), True
+        )
+        # schedule ждёт on_commit, которого в TestCase нет.
+        thumbnails._enqueue(
+            post.image.name, thumbnails.renditions(post.image_width),
+            caching.post_tags(post),
+        )
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, '<source type="image/webp" srcset="')
+        self.assertContains(response, ' 640w" sizes="')
+        self.assertContains(response, 'width="640" height="226"')
+
+    def test_renditions_fit_image(self):
+        """Копии не шире оригинала, в каждом формате — все ширины."""
+        with override_settings(POSTS_IMAGE_WIDTHS=(320, 640, 960),
+                               POSTS_IMAGE_FORMATS=('WEBP', 'JPEG')):
+            specs = thumbnails.renditions(700)
+        self.assertEqual(
+            [(geometry, options['format']) for geometry, options in specs],
+            [('320x113', 'WEBP'), ('640x226', 'WEBP'),
+             ('320x113', 'JPEG'), ('640x226', 'JPEG')],
+        )
+        self.assertEqual(len(thumbnails.renditions(100)), 2)
+
+    def test_failed_source_is_not_retried(self):
+        """Битый исходник не сбрасывает кэш страниц и не ставится снова."""
+        cache.clear()
+        name = 'posts/missing.jpg'
+        specs = thumbnails.renditions(320)
+        tags = ['posts']
+        before = caching.tag_versions(tags)
+        with self.assertLogs('posts.thumbnails', 'ERROR'):
+            thumbnails.generate(name, specs, tags)
+        self.assertEqual(caching.tag_versions(tags), before)
+        self.assertTrue(thumbnails.has_failed(name))
+        with mock.patch.object(thumbnails, 'generate') as generate:
+            thumbnails._enqueue(name, specs, tags)
+        generate.assert_not_called()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def upload(self, content, name='picture.gif'):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Картинка',
+                'image': SimpleUploadedFile(name, content),
+            },
+        )
+
+    def test_rejected_uploads(self):
+        """Слишком большие файлы и картинки и чужие форматы отклоняются."""
+        cases = (
+            ({'POSTS_IMAGE_MAX_BYTES': 16}, image_bytes()),
+            ({'POSTS_IMAGE_MAX_PIXELS': 4}, image_bytes()),
+            ({}, image_bytes(image_format='BMP')),
+            ({}, b'not an image'),
+        )
+        for overrides, content in cases:
+            with self.subTest(overrides=overrides):
+                with override_settings(**overrides):
+                    response = self.upload(content)
+                self.assertIn('image', response.context['form'].errors)
+        self.assertFalse(Post.objects.exists())
+
+    def test_admin_uses_same_checks(self):
+        """Админка не сохраняет обрезанные и слишком большие картинки."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.authorized_client.force_login(admin)
+        for overrides in ({'POSTS_IMAGE_MAX_BYTES': 16},
+                          {'POSTS_IMAGE_MAX_PIXELS': 4}):
+            with self.subTest(overrides=overrides):
+                with override_settings(**overrides):
+                    response = self.authorized_client.post(
+                        reverse('admin:posts_post_add'),
+                        data={
+                            'text': 'Из админки',
+                            'author': admin.pk,
+                            'image': SimpleUploadedFile(
+                                'picture.gif', image_bytes()
+                            ),
+                        },
+                    )
+                self.assertIn(
+                    'image', response.context['adminform'].form.errors
+                )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POSTS_IMAGE_MAX_SIDE=2)
+    def test_oversized_image_downsampled(self):
+        """Оригинал больше предела уменьшается до сохранения."""
+        self.upload(image_bytes(size=(8, 4), image_format='PNG'),
+                    name='picture.png')
+        post = Post.objects.get()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reposter')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, content, name='meme.gif'):
+        return Post.objects.create(
+            author=self.user, text='Мем',
+            image=SimpleUploadedFile(name, content),
+        )
+
+    def test_identical_uploads_share_file(self):
+        """Одинаковые картинки хранятся одним файлом под своим хешем."""
+        first = self.create_post(image_bytes(), name='first.gif')
+        second = self.create_post(image_bytes(), name='second.gif')
+        other = self.create_post(image_bytes(size=(2, 2)))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertRegex(
+            first.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$'
+        )
+
+    def test_reused_file_is_touched(self):
+        """Повторная загрузка обновляет mtime, и collect_media её ждёт."""
+        orphan = self.create_post(image_bytes(size=(3, 3)))
+        path = orphan.image.path
+        orphan.delete()
+        os.utime(path, (0, 0))
+        self.create_post(image_bytes(size=(3, 3)))
+        self.assertGreater(os.path.getmtime(path), 0)
+
+    def test_collect_media_removes_orphans(self):
+        """collect_media удаляет только файлы без ссылок."""
+        kept = self.create_post(image_bytes())
+        self.create_post(image_bytes())
+        orphan = self.create_post(image_bytes(size=(2, 2)))
+        orphan_path = orphan.image.path
+        orphan.delete()
+        Post.objects.exclude(pk=kept.pk).delete()
+
+        call_command('collect_media', min_age=0, stdout=StringIO())
+
+        self.assertTrue(os.path.exists(kept.image.path))
+        self.assertFalse(os.path.exists(orphan_path))
+
+
+class CommentFormTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commenter')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        cls.url = reverse('posts:add_comment', kwargs={'post_id': cls.post.pk})
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_plain_post_redirects(self):
+        response = self.authorized_client.post(self.url, {'text': 'Привет'})
+        self.assertRedirects(
+            response,
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        self.assertEqual(self.post.comments.count(), 1)
+
+    def test_xhr_returns_fragment(self):
+        """XHR получает только новый комментарий, без страницы поста."""
+        response = self.authorized_client.post(
+            self.url, {'text': 'Привет'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertTemplateUsed(response, 'posts/includes/comment.html')
+        self.assertTemplateNotUsed(response, 'posts/post_detail.html')
+        self.assertContains(response, 'Привет',
+                            status_code=HTTPStatus.CREATED)
+        self.assertEqual(self.post.comments.count(), 1)
+
+    def test_xhr_invalid_returns_errors(self):
+        response = self.authorized_client.post(
+            self.url, {'text': ''},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertTemplateUsed(response, 'posts/includes/comment_form.html')
+        self.assertTrue(response.context['form'].errors)
+        self.assertFalse(self.post.comments.exists())
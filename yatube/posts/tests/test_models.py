@@ -1,7 +1,16 @@
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
 
-from ..models import Group, Post
+from .. import counts, search, transfer
+from ..models import Comment, Follow, Group, Post, Profile
 
 User = get_user_model()
 
@@ -34,3 +43,137 @@ class PostModelTest(TestCase):
         group = self.group
         expected_name = group.title
         self.assertEqual(expected_name, str(group))
+
+
+class CountersTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='counter')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='counter', description='Описание'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def counters(self, user):
+        return Profile.objects.get(user=user)
+
+    def test_counters_follow_signals(self):
+        """Счётчики сдвигаются при создании, переносе и удалении."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        self.assertEqual(self.counters(self.user).posts_count, 1)
+        self.assertEqual(counts.posts_count(), 1)
+        post.group = self.group
+        post.save()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.counters(self.reader).comments_count, 1)
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(self.counters(self.user).followers_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+        follow.delete()
+        post.delete()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.counters(self.user).posts_count, 0)
+        self.assertEqual(self.counters(self.user).followers_count, 0)
+        self.assertEqual(self.counters(self.reader).comments_count, 0)
+        self.assertEqual(counts.posts_count(), 0)
+
+    def test_recount(self):
+        """recount_counters чинит разошедшиеся счётчики."""
+        Post.objects.create(author=self.user, text='Пост', group=self.group)
+        Profile.objects.update(posts_count=100)
+        Group.objects.update(posts_count=100)
+        cache.set(counts.ALL_POSTS_KEY, 100)
+        call_command('recount_counters', stdout=StringIO())
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(self.counters(self.user).posts_count, 1)
+        self.assertEqual(self.counters(self.reader).posts_count, 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(counts.posts_count(), 1)
+
+
+class TransferTest(TestCase):
+    NAMES = ('groups', 'posts', 'comments', 'follows')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        self.post = Post.objects.create(
+            author=self.user, group=self.group, text='Выгружаемый пост'
+        )
+        self.old_date = timezone.now() - timedelta(days=30)
+        Post.objects.filter(pk=self.post.pk).update(pub_date=self.old_date)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.user)
+
+    def path(self, name, fmt):
+        return os.path.join(self.directory.name, f'{name}.{fmt}')
+
+    def round_trip(self, fmt):
+        for name in self.NAMES:
+            call_command('export_data', name, format=fmt,
+                         output=self.path(name, fmt), stderr=StringIO())
+        for name in self.NAMES:
+            transfer.SPECS[name].model.objects.all().delete()
+        self.assertFalse(Comment.objects.exists())
+        for name in self.NAMES:
+            call_command('import_data', name, self.path(name, fmt),
+                         format=fmt, batch_size=1,
+                         stdout=StringIO(), stderr=StringIO())
+
+    def test_round_trip(self):
+        """Данные переживают выгрузку и загрузку, производные пересобраны."""
+        for fmt in ('ndjson', 'csv'):
+            with self.subTest(fmt=fmt):
+                self.round_trip(fmt)
+                post = Post.objects.get()
+                self.assertEqual(post.pk, self.post.pk)
+                self.assertEqual(post.pub_date, self.old_date)
+                self.assertEqual(post.group, self.group)
+                self.assertEqual(post.comments_count, 1)
+                self.assertEqual(
+                    Profile.objects.get(user=self.user).followers_count, 1
+                )
+                self.assertTrue(Follow.objects.filter(
+                    user=self.reader, author=self.user).exists())
+                self.assertEqual(
+                    list(search.search(Post.objects.all(), 'выгружаемый')[0]),
+                    [post],
+                )
+
+    def test_resume_from_checkpoint(self):
+        path = self.path('groups', 'ndjson')
+        call_command('export_data', 'groups', output=path, stderr=StringIO())
+        with open(path, 'a', encoding='utf-8') as stream:
+            stream.write('{"id": 99, "title": "Вторая", "slug": "second", '
+                         '"description": ""}\n')
+        Group.objects.all().delete()
+        with open(f'{path}.checkpoint', 'w') as stream:
+            stream.write('1')
+        call_command('import_data', 'groups', path, skip_rebuild=True,
+                     stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(
+            list(Group.objects.values_list('slug', flat=True)), ['second']
+        )
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
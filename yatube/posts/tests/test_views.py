@@ -1,9 +1,22 @@
+from datetime import timedelta
+from http import HTTPStatus
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
 from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.paginator import EmptyPage
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
-from ..models import Post, Group, Follow, Comment
+from .. import (caching, counts, ranking, search, suggestions, timeline,
+               views)
+from ..models import (Post, Group, Follow, Comment, PostRank, Profile,
+                      Suggestion, TimelineEntry)
+from ..paginator import KeysetPaginator, encode_cursor
 
 AMOUNT_POST = 13
 User = get_user_model()
@@ -156,15 +169,107 @@ class IndexCacheTests(TestCase):
         self.authorized_client.force_login(self.user)
 
     def test_cache_index_page(self):
-        first_state = self.authorized_client.get(self.url_index)
+        cache.clear()
+        first_state = self.guest_client.get(self.url_index)
+        second_state = self.guest_client.get(self.url_index)
+        self.assertEqual(first_state.content, second_state.content)
+        self.assertIsNone(second_state.context)
         post = Post.objects.get(id=self.test_post.id)
         post.text = 'Изменённый текст'
         post.save()
-        second_state = self.authorized_client.get(self.url_index)
-        self.assertEqual(first_state.content, second_state.content)
-        cache.clear()
-        third_state = self.authorized_client.get(self.url_index)
+        third_state = self.guest_client.get(self.url_index)
         self.assertNotEqual(first_state.content, third_state.content)
+        self.assertContains(third_state, 'Изменённый текст')
+
+    def test_index_page_cached_for_guests_only(self):
+        """Гостям отдаётся готовая страница, остальным — сборка из кусков."""
+        cache.clear()
+        self.guest_client.get(self.url_index)
+        self.assertIsNone(self.guest_client.get(self.url_index).context)
+        self.authorized_client.get(self.url_index)
+        self.assertIsNotNone(
+            self.authorized_client.get(self.url_index).context
+        )
+
+    def test_index_fragments_shared_between_users(self):
+        """Общие карточки постов не уносят чужие ссылки на правку."""
+        cache.clear()
+        author_client = Client()
+        author_client.force_login(self.test_user)
+        url_edit = reverse(
+            'posts:post_edit', kwargs={'post_id': self.test_post.id}
+        )
+        self.assertContains(author_client.get(self.url_index), url_edit)
+        self.assertNotContains(
+            self.authorized_client.get(self.url_index), url_edit
+        )
+        self.assertNotContains(self.guest_client.get(self.url_index), url_edit)
+
+    def test_index_card_survives_other_posts(self):
+        """Новый пост не сбрасывает закэшированные карточки других."""
+        cache.clear()
+        response = self.authorized_client.get(self.url_index)
+        post = next(
+            p for p in response.context['page_obj'] if p == self.test_post
+        )
+        key = make_template_fragment_key(
+            'index_post', [post.pk, post.cache_version]
+        )
+        Post.objects.create(author=self.user, text='Другая запись')
+        self.authorized_client.get(self.url_index)
+        self.assertIsNotNone(cache.get(key))
+        self.test_user.first_name = 'Новое имя'
+        self.test_user.save()
+        self.assertContains(
+            self.authorized_client.get(self.url_index), 'Новое имя'
+        )
+
+    def test_comment_invalidates_only_its_post(self):
+        """Комментарий сбрасывает страницу поста, но не чужие страницы."""
+        cache.clear()
+        other_post = Post.objects.create(author=self.user, text='Другой')
+        commenter = User.objects.create_user(username='commenter')
+        url_detail = reverse(
+            'posts:post_detail', kwargs={'post_id': self.test_post.id}
+        )
+        url_other = reverse(
+            'posts:post_detail', kwargs={'post_id': other_post.id}
+        )
+        self.guest_client.get(url_detail)
+        self.guest_client.get(url_other)
+        Comment.objects.create(
+            post=self.test_post, author=commenter, text='Новый комментарий'
+        )
+        self.assertContains(
+            self.guest_client.get(url_detail), 'Новый комментарий'
+        )
+        self.assertIsNone(self.guest_client.get(url_other).context)
+
+    def test_new_post_invalidates_index(self):
+        """Пост из формы виден на главной сразу, без ожидания TTL."""
+        cache.clear()
+        self.authorized_client.get(self.url_index)
+        self.authorized_client.post(
+            reverse('posts:post_create'), {'text': 'Свежая запись'}
+        )
+        response = self.authorized_client.get(self.url_index)
+        self.assertContains(response, 'Свежая запись')
+
+
+class CacheTransactionTests(TransactionTestCase):
+    def test_invalidate_after_commit(self):
+        """Версии меток меняются повторно после commit транзакции."""
+        user = User.objects.create_user(username='auth')
+        client = Client()
+        url_index = reverse('posts:index')
+        cache.clear()
+        client.get(url_index)
+        with transaction.atomic():
+            Post.objects.create(author=user, text='Из транзакции')
+            in_transaction = caching.tag_versions(['posts'])
+        self.assertNotEqual(caching.tag_versions(['posts']), in_transaction)
+        self.assertContains(client.get(url_index), 'Из транзакции')
+
 
 class FollowTests(TestCase):
     @classmethod
@@ -209,3 +314,735 @@ class FollowTests(TestCase):
         self.assertEqual(post_text_0, 'Тестовый текст')
         response = self.authorized_following.get('/follow/')
         self.assertNotContains(response, 'Тестовый текст')
+
+    def feed_texts(self):
+        response = self.authorized_follower.get(reverse('posts:follow_index'))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_timeline_fan_out_and_prune(self):
+        """Новый пост раскладывается в ленту, отписка её очищает."""
+        Follow.objects.create(user=self.follower, author=self.following)
+        Post.objects.create(author=self.following, text='Новый пост')
+        self.assertEqual(TimelineEntry.objects.count(), 2)
+        self.assertEqual(self.feed_texts(), ['Новый пост', 'Тестовый текст'])
+        Follow.objects.filter(user=self.follower).delete()
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed_texts(), [])
+
+    @override_settings(POSTS_TIMELINE_FANOUT_LIMIT=0)
+    def test_timeline_pull_for_popular_authors(self):
+        """Посты популярных авторов подмешиваются при чтении."""
+        Follow.objects.create(user=self.follower, author=self.following)
+        Post.objects.create(author=self.following, text='Новый пост')
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed_texts(), ['Новый пост', 'Тестовый текст'])
+        # Подмешиваемые авторы берутся из кэша, без соединения с Follow.
+        cache.clear()
+        self.feed_texts()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(self.feed_texts()), 2)
+        self.assertFalse(any(
+            'posts_profile' in query['sql'] for query in queries
+        ))
+
+    @override_settings(POSTS_TIMELINE_FANOUT_LIMIT=1)
+    def test_timeline_author_crosses_limit_both_ways(self):
+        """Посты периода fan-out on read остаются в ленте после него."""
+        Follow.objects.create(user=self.follower, author=self.following)
+        Post.objects.create(author=self.following, text='До порога')
+        other = User.objects.create_user(username='other-follower')
+        Follow.objects.create(user=other, author=self.following)
+        Post.objects.create(author=self.following, text='Выше порога')
+        self.assertEqual(
+            self.feed_texts(), ['Выше порога', 'До порога', 'Тестовый текст']
+        )
+        Follow.objects.filter(user=other).delete()
+        self.assertEqual(
+            self.feed_texts(), ['Выше порога', 'До порога', 'Тестовый текст']
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.follower).count(), 3
+        )
+
+    def test_timeline_rebuild_does_not_query_per_follow(self):
+        """Пересборка лент делает запросы пачками, а не на подписку."""
+        Follow.objects.create(user=self.follower, author=self.following)
+
+        def rebuild_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                timeline.rebuild()
+            return len(queries)
+
+        one_follow = rebuild_queries()
+        for number in range(3):
+            user = User.objects.create_user(username=f'reader{number}')
+            Follow.objects.create(user=user, author=self.following)
+            Follow.objects.create(user=user, author=self.follower)
+        self.assertEqual(rebuild_queries(), one_follow)
+        self.assertEqual(TimelineEntry.objects.count(), 4)
+        self.assertEqual(self.feed_texts(), ['Тестовый текст'])
+
+    @override_settings(
+        POSTS_TIMELINE_BACKEND='posts.timeline.LocMemTimeline'
+    )
+    def test_locmem_timeline(self):
+        Follow.objects.create(user=self.follower, author=self.following)
+        self.assertEqual(self.feed_texts(), ['Тестовый текст'])
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_follow_is_idempotent(self):
+        url = reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.following.username},
+        )
+        for _ in range(2):
+            self.authorized_follower.get(url)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.following.profile.refresh_from_db()
+        self.assertEqual(self.following.profile.followers_count, 1)
+        self.assertEqual(TimelineEntry.objects.count(), 1)
+
+    def test_follow_pair_is_unique(self):
+        Follow.objects.create(user=self.follower, author=self.following)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.follower, author=self.following)
+
+    def test_follow_batch(self):
+        others = [
+            User.objects.create_user(username=f'author{number}')
+            for number in range(3)
+        ]
+        url = reverse('posts:follow_batch')
+        names = [user.username for user in others] + ['follower', 'nobody']
+        response = self.authorized_follower.post(
+            url, {'action': 'follow', 'author': names}
+        )
+        self.assertEqual(response.json()['changed'],
+                         ['author0', 'author1', 'author2'])
+        self.assertEqual(Follow.objects.filter(user=self.follower).count(), 3)
+        response = self.authorized_follower.post(
+            url, {'action': 'follow', 'author': names}
+        )
+        self.assertEqual(response.json()['changed'], [])
+        response = self.authorized_follower.post(
+            url, {'action': 'unfollow', 'author': ['author1']}
+        )
+        self.assertEqual(response.json()['changed'], ['author1'])
+        self.follower.profile.refresh_from_db()
+        self.assertEqual(self.follower.profile.following_count, 2)
+        response = self.authorized_follower.post(url, {'action': 'drop'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+
+class PaginatorViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='paginator')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {number}')
+            for number in range(AMOUNT_POST)
+        )
+        counts.recount()
+        cls.url_profile = reverse(
+            'posts:profile', kwargs={'username': cls.user.username}
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_cursor_pages(self):
+        """Курсоры ?after= и ?before= листают ленту без пропусков."""
+        first_page = self.guest_client.get(self.url_profile).context[
+            'page_obj']
+        self.assertEqual(len(first_page), 10)
+        self.assertFalse(first_page.has_previous())
+        second_page = self.guest_client.get(
+            self.url_profile, {'after': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second_page), AMOUNT_POST - 10)
+        self.assertEqual(second_page.number, 2)
+        self.assertFalse(second_page.has_next())
+        # Номера в окне — только соседи, открываемые курсором.
+        self.assertEqual(first_page.page_window, [1, 2])
+        response = self.guest_client.get(self.url_profile)
+        self.assertNotContains(response, 'page=2')
+        back = self.guest_client.get(
+            self.url_profile, {'before': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back), list(first_page))
+        self.assertEqual(back.number, 1)
+
+    def test_legacy_page_number_and_broken_cursor(self):
+        """Старые ссылки ?page=N работают, битый курсор ведёт на начало."""
+        second_page = self.guest_client.get(
+            self.url_profile, {'page': 2}
+        ).context['page_obj']
+        self.assertEqual(len(second_page), AMOUNT_POST - 10)
+        # Номер за концом ведёт на последнюю страницу.
+        beyond = self.guest_client.get(
+            self.url_profile, {'page': 1000}
+        ).context['page_obj']
+        self.assertEqual(beyond.number, 2)
+        broken = self.guest_client.get(
+            self.url_profile, {'after': 'не-курсор'}
+        ).context['page_obj']
+        self.assertEqual(broken.number, 1)
+
+    def test_last_page_and_window(self):
+        """Последняя страница и окно номеров строятся по счётчику."""
+        last_page = self.guest_client.get(
+            self.url_profile, {'page': 'last'}
+        ).context['page_obj']
+        self.assertEqual(last_page.number, 2)
+        self.assertEqual(len(last_page), AMOUNT_POST - 10)
+        self.assertEqual(last_page.page_window, [1, 2])
+
+    def test_deep_page_number_is_capped(self):
+        """Номер больше предела и страница за концом списка — 404."""
+        paginator = KeysetPaginator(
+            Post.objects.all(), 1, keys=('-pub_date', '-id')
+        )
+        paginator.offset_limit = 3
+        self.assertEqual(paginator.get_page(3).number, 3)
+        with self.assertRaises(EmptyPage):
+            paginator.get_page(5)
+        paginator.offset_limit = 100
+        with self.assertRaises(EmptyPage):
+            paginator.get_page(50)
+
+    def test_cursor_past_end_is_not_found(self):
+        last_page = self.guest_client.get(
+            self.url_profile, {'page': 'last'}
+        ).context['page_obj']
+        oldest = last_page[len(last_page) - 1]
+        cursor = encode_cursor(3, [oldest.pub_date, oldest.pk])
+        response = self.guest_client.get(self.url_profile, {'after': cursor})
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class QueryBudgetTests(TestCase):
+    """Число запросов страницы не зависит от числа постов на ней."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='prolific')
+        cls.group = Group.objects.create(
+            title='Общая', slug='hot', description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(10):
+            guest_author = User.objects.create_user(username=f'guest{number}')
+            Follow.objects.create(user=cls.reader, author=guest_author)
+            Post.objects.create(
+                author=guest_author, group=cls.group, text='Пост'
+            )
+            cls.post = Post.objects.create(
+                author=cls.author,
+                group=Group.objects.create(
+                    title=f'Группа {number}', slug=f'group-{number}',
+                    description='Описание'
+                ),
+                text='Пост автора',
+            )
+            Comment.objects.create(
+                post=cls.post, author=guest_author, text='Комментарий'
+            )
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        cache.clear()
+
+    def test_public_pages_query_budget(self):
+        # Валидаторы для условного GET, объект страницы и лента;
+        # метки главной известны без запроса, ей нужно число постов.
+        budgets = {
+            reverse('posts:index'): 2,
+            reverse('posts:group_list', kwargs={'slug': 'hot'}): 3,
+            reverse('posts:profile', kwargs={'username': 'prolific'}): 3,
+            reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.pk}
+            ): 3,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(budget):
+                    self.guest_client.get(url)
+
+    def test_follow_index_query_budget(self):
+        # Сессия, пользователь, авторы для fan-out on read, сама лента
+        # и рекомендации (множество подписок нужно, только если они есть).
+        with self.assertNumQueries(5):
+            self.authorized_client.get(reverse('posts:follow_index'))
+        # Список авторов для fan-out on read живёт в кэше.
+        with self.assertNumQueries(4):
+            self.authorized_client.get(reverse('posts:follow_index'))
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='conditional')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': cls.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_not_modified(self):
+        """Совпавший ETag даёт 304 без запроса страницы и отрисовки."""
+        # Главной метки известны заранее, остальным нужен id объекта.
+        for url, budget in zip(self.urls, (0, 1, 1)):
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                with self.assertNumQueries(budget):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    )
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+
+    def test_etag_changes_with_content(self):
+        """Новый комментарий меняет ETag страницы поста."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        first = self.guest_client.get(url)
+        Comment.objects.create(post=self.post, author=self.user, text='Ок')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_edit_is_not_hidden_by_if_modified_since(self):
+        """Правка поста видна и клиенту, который шлёт только дату."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        first = self.guest_client.get(url)
+        self.assertNotIn('Last-Modified', first)
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT'
+        )
+        self.assertContains(response, 'Исправленный пост')
+
+
+class CommentsPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='talker')
+        cls.post = Post.objects.create(author=cls.user, text='Обсуждение')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(views.AMOUNT_COMMENTS + 5)
+        )
+        counts.recount()
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_post_detail_shows_first_page(self):
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), views.AMOUNT_COMMENTS)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        self.assertContains(response, comments.next_cursor)
+
+    def test_load_more(self):
+        first = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        ).context['comments']
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+        with self.assertNumQueries(3):
+            response = self.guest_client.get(
+                url, {'after': first.next_cursor}
+            )
+        self.assertEqual(len(response.context['comments']), 5)
+        self.assertContains(response, 'Комментарий 24')
+        self.assertNotContains(response, 'data-load-more')
+
+        data = self.guest_client.get(
+            url, {'after': first.next_cursor, 'format': 'json'}
+        ).json()
+        self.assertEqual(len(data['comments']), 5)
+        self.assertIsNone(data['next'])
+
+    def test_follow_button_returns_to_post(self):
+        """Кнопка подписки во фрагменте ведёт обратно на страницу поста."""
+        reader = User.objects.create_user(username='reader')
+        self.guest_client.force_login(reader)
+        first = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        ).context['comments']
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {'after': first.next_cursor},
+        )
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.assertContains(response, f'?next={detail}"')
+        self.assertNotContains(response, 'comments/%3Fafter')
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='writer')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Питомцы', slug='pets', description='Про питомцев'
+        )
+        cls.cats = Post.objects.create(
+            author=cls.user, group=cls.group, text='Кошки, кошки и ещё кошки'
+        )
+        cls.both = Post.objects.create(
+            author=cls.other, text='Кошки и собаки живут дружно'
+        )
+        cls.dogs = Post.objects.create(author=cls.user, text='Собачья жизнь')
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.url = reverse('posts:search')
+
+    def found(self, **params):
+        response = self.guest_client.get(self.url, params)
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_ranked_results(self):
+        """Находит по префиксу слова, чаще упомянутое — выше."""
+        self.assertEqual(self.found(q='кош'), [self.cats.pk, self.both.pk])
+        self.assertEqual(self.found(q='кошки собаки'), [self.both.pk])
+        self.assertEqual(self.found(q=''), [])
+
+    def test_filters(self):
+        self.assertEqual(self.found(q='кошки', group='pets'), [self.cats.pk])
+        self.assertEqual(self.found(q='кошки', author='other'),
+                         [self.both.pk])
+
+    def test_index_follows_edits(self):
+        self.dogs.text = 'Теперь тут про кошек'
+        self.dogs.save()
+        Post.objects.filter(pk=self.cats.pk).delete()
+        self.assertCountEqual(self.found(q='кош'),
+                              [self.both.pk, self.dogs.pk])
+
+    def test_keyset_pages(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Ёжики {i}')
+            for i in range(views.AMOUNT_POST + 2)
+        )
+        search.rebuild()
+        response = self.guest_client.get(self.url, {'q': 'ёжики'})
+        page = response.context['page_obj']
+        self.assertEqual(len(page), views.AMOUNT_POST)
+        self.assertContains(
+            response, 'q=%D1%91%D0%B6%D0%B8%D0%BA%D0%B8&amp;after='
+        )
+        response = self.guest_client.get(
+            self.url, {'q': 'ёжики', 'after': page.next_cursor}
+        )
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    def test_admin_uses_index(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.guest_client.force_login(admin)
+        response = self.guest_client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собак'}
+        )
+        self.assertEqual(
+            [post.pk for post in response.context['cl'].result_list],
+            [self.both.pk],
+        )
+
+
+class FollowingSetTests(TestCase):
+    """Кнопки подписки у авторов стоят не больше одного запроса."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{number}')
+            for number in range(12)
+        ]
+        for author in cls.authors:
+            Post.objects.create(author=author, text='Пост')
+        for author in cls.authors[-3:]:
+            Follow.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def follow_queries(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('posts:index'))
+        return response, [
+            query for query in captured if 'posts_follow' in query['sql']
+        ]
+
+    def test_buttons_cost_one_query(self):
+        response, queries = self.follow_queries()
+        self.assertEqual(len(queries), 1)
+        self.assertContains(response, 'Отписаться', count=3)
+        self.assertContains(response, 'Подписаться', count=7)
+        # Между запросами множество берётся из кэша.
+        response, queries = self.follow_queries()
+        self.assertEqual(queries, [])
+
+    def test_follow_refreshes_set(self):
+        self.follow_queries()
+        author = self.authors[5]
+        url = reverse('posts:profile_follow',
+                      kwargs={'username': author.username})
+        response = self.client.get(url, {'next': reverse('posts:index')})
+        self.assertRedirects(response, reverse('posts:index'),
+                             fetch_redirect_response=False)
+        response, queries = self.follow_queries()
+        self.assertEqual(len(queries), 1)
+        self.assertContains(response, 'Отписаться', count=4)
+
+    def test_profile_uses_set(self):
+        response = self.client.get(reverse(
+            'posts:profile', kwargs={'username': self.authors[-1].username}
+        ))
+        self.assertTrue(response.context['following'])
+
+    def test_guest_gets_no_buttons(self):
+        self.client.logout()
+        response, queries = self.follow_queries()
+        self.assertEqual(queries, [])
+        self.assertNotContains(response, 'Подписаться')
+
+
+class FollowListTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.star = User.objects.create_user(username='star')
+        cls.fans = [
+            User.objects.create_user(username=f'fan{number:02}')
+            for number in range(views.AMOUNT_POST + 5)
+        ]
+        for fan in cls.fans:
+            Follow.objects.follow(fan.pk, cls.star.pk)
+        # Звезда подписана на двух последних подписчиков.
+        for fan in cls.fans[-2:]:
+            Follow.objects.follow(cls.star.pk, fan.pk)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.star)
+        self.url = reverse('posts:followers',
+                           kwargs={'username': self.star.username})
+
+    def test_followers_pages(self):
+        with CaptureQueriesContext(connection) as first:
+            response = self.client.get(self.url)
+        page = response.context['page_obj']
+        self.assertEqual(page.paginator.count, len(self.fans))
+        names = [person.username for person, _ in response.context['people']]
+        self.assertEqual(names, [
+            fan.username for fan in reversed(self.fans)
+        ][:views.AMOUNT_POST])
+        cache.clear()
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(self.url, {'after': page.next_cursor})
+        self.assertEqual(len(response.context['people']), 5)
+        # Число запросов не зависит от страницы и числа строк на ней.
+        self.assertEqual(len(first), len(second))
+
+    def test_follows_you_flag(self):
+        """Флаг «подписан на вас» для смотрящего считается одним запросом."""
+        fan = self.fans[-1]
+        self.client.force_login(fan)
+        response = self.client.get(reverse(
+            'posts:following', kwargs={'username': self.star.username}
+        ))
+        flags = {
+            person.username: follows_you
+            for person, follows_you in response.context['people']
+        }
+        self.assertEqual(flags, {'fan14': False, 'fan13': False})
+        response = self.client.get(reverse(
+            'posts:following', kwargs={'username': fan.username}
+        ))
+        self.assertEqual(
+            [(person.username, follows_you)
+             for person, follows_you in response.context['people']],
+            [('star', True)],
+        )
+        self.assertContains(response, 'Подписан на вас')
+
+    def test_guest(self):
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertFalse(any(
+            follows_you for _, follows_you in response.context['people']
+        ))
+
+
+class SuggestionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = {
+            name: User.objects.create_user(username=name)
+            for name in ('reader', 'friend', 'other', 'star', 'niche')
+        }
+        for user, author in (('reader', 'friend'), ('reader', 'other'),
+                             ('friend', 'star'), ('other', 'star'),
+                             ('friend', 'niche')):
+            Follow.objects.create(user=cls.users[user],
+                                  author=cls.users[author])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.users['reader'])
+
+    def ids(self, *names):
+        return [self.users[name].pk for name in names]
+
+    def test_graph_scores_friends_of_friends(self):
+        graph = suggestions.Graph({1: {2, 3}, 2: {4, 5, 1}, 3: {4}})
+        ranked = [author_id for author_id, _ in graph.suggest(1)]
+        self.assertEqual(ranked, [4, 5])
+
+    def test_follow_index_shows_stored_suggestions(self):
+        self.assertEqual(suggestions.refresh(full=True)[0], 5)
+        self.assertEqual(
+            list(Suggestion.objects.filter(
+                user=self.users['reader']
+            ).order_by('-score').values_list('author_id', flat=True)),
+            self.ids('star', 'niche'),
+        )
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            [author.pk for author in response.context['suggestions']],
+            self.ids('star', 'niche'),
+        )
+
+    def test_follow_updates_incrementally(self):
+        suggestions.refresh(full=True)
+        self.assertFalse(Profile.objects.filter(
+            suggestions_stale=True
+        ).exists())
+        Follow.objects.follow(*self.ids('reader', 'star'))
+        self.assertFalse(Suggestion.objects.filter(
+            user=self.users['reader'], author=self.users['star']
+        ).exists())
+        # Пересчитывается только тот, чьи подписки изменились.
+        self.assertEqual(suggestions.refresh(), (1, 1))
+
+
+class PopularFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='popular-group', description='Описание'
+        )
+        cls.discussed = Post.objects.create(
+            author=cls.author, group=cls.group, text='Обсуждаемый пост'
+        )
+        for number in range(3):
+            Comment.objects.create(
+                post=cls.discussed, author=cls.reader, text=f'Ответ {number}'
+            )
+        cls.quiet = Post.objects.create(author=cls.author, text='Тихий пост')
+
+    def setUp(self):
+        cache.clear()
+        ranking.rebuild()
+
+    def ids(self, url):
+        response = self.client.get(url)
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_comments_outrank_newer_posts(self):
+        self.assertEqual(
+            self.ids(reverse('posts:popular')),
+            [self.discussed.pk, self.quiet.pk],
+        )
+
+    def test_group_variant(self):
+        url = reverse('posts:group_popular', kwargs={'slug': 'popular-group'})
+        self.assertEqual(self.ids(url), [self.discussed.pk])
+        self.quiet.group = self.group
+        self.quiet.save()
+        self.assertEqual(self.ids(url), [self.discussed.pk, self.quiet.pk])
+
+    def test_update_counts_only_new_events(self):
+        before = PostRank.objects.get(post=self.quiet).score
+        self.assertEqual(ranking.update(), (0, 0))
+        fresh = Post.objects.create(author=self.reader, text='Новый пост')
+        for number in range(5):
+            Comment.objects.create(
+                post=self.quiet, author=self.reader, text=f'Ещё {number}'
+            )
+        self.assertEqual(ranking.update(), (1, 1))
+        self.assertGreater(PostRank.objects.get(post=self.quiet).score, before)
+        # Страница кэширована, но обновление сбрасывает метку popular.
+        self.assertEqual(
+            self.ids(reverse('posts:popular')),
+            [self.quiet.pk, self.discussed.pk, fresh.pk],
+        )
+        # Инкрементальный подсчёт совпадает с пересчётом с нуля.
+        scores = dict(PostRank.objects.values_list('post_id', 'score'))
+        ranking.rebuild()
+        for post_id, score in PostRank.objects.values_list('post_id', 'score'):
+            self.assertAlmostEqual(scores[post_id], score)
+
+    def test_old_follows_are_not_events(self):
+        """Пересчёт не считает прежние подписки свежими событиями."""
+        star = User.objects.create_user(username='star')
+        old = Post.objects.create(author=star, text='Старый пост звезды')
+        Post.objects.filter(pk=old.pk).update(
+            pub_date=timezone.now() - timedelta(days=5)
+        )
+        for number in range(50):
+            Follow.objects.create(
+                user=User.objects.create_user(username=f'fan{number}'),
+                author=star,
+            )
+        fresh = Post.objects.create(author=self.reader, text='Свежий пост')
+        ranking.rebuild()
+        scores = dict(PostRank.objects.values_list('post_id', 'score'))
+        self.assertGreater(scores[fresh.pk], scores[old.pk])
+        # Новая подписка после пересчёта — событие.
+        Follow.objects.create(user=self.reader, author=star)
+        self.assertEqual(ranking.update(), (0, 1))
+        self.assertGreater(
+            PostRank.objects.get(post=old).score, scores[old.pk]
+        )
+
+    def test_deleted_post_leaves_popular_page(self):
+        url = reverse('posts:popular')
+        self.assertIn(self.quiet.pk, self.ids(url))
+        Post.objects.get(pk=self.quiet.pk).delete()
+        self.assertNotIn(self.quiet.pk, self.ids(url))
+
+    def test_query_budget_matches_index(self):
+        # Одна выборка по индексу, как у хронологической ленты.
+        with CaptureQueriesContext(connection) as index:
+            self.client.get(reverse('posts:index'))
+        cache.clear()
+        with CaptureQueriesContext(connection) as popular:
+            self.client.get(reverse('posts:popular'))
+        self.assertLessEqual(len(popular), len(index))
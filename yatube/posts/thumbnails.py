@@ -0,0 +1,227 @@
+"""Миниатюры картинок постов вне цикла запроса.
+
+Бэкенд sorl (THUMBNAIL_BACKEND) отдаёт миниатюру, только если она уже
+есть в key-value хранилище sorl. Иначе он ставит её генерацию в очередь
+фонового пула потоков и возвращает оригинал, так что тег
+{% thumbnail %} в шаблонах не ждёт Pillow. post_create и post_edit
+ставят миниатюры новой картинки в очередь сразу после сохранения.
+
+Картинка поста хранится в нескольких ширинах (POSTS_IMAGE_WIDTHS)
+и форматах (POSTS_IMAGE_FORMATS): из них шаблоны собирают srcset.
+Число потоков задаёт POSTS_THUMBNAIL_WORKERS; при 0 миниатюры
+создаются синхронно. Картинка, копии которой создать не удалось,
+запоминается в кэше на FAILED_TIMEOUT секунд и в очередь не ставится.
+"""
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.engines import pil_engine
+from sorl.thumbnail.images import ImageFile
+
+from . import caching
+from .storage import post_images
+
+logger = logging.getLogger(__name__)
+
+WORKERS = 2
+# Пропорции кадра картинки в ленте и на странице поста.
+FRAME = (960, 339)
+WIDTHS = (320, 640, 960)
+# Первый формат — основной, последний — запасной для <img>.
+FORMATS = ('WEBP', 'JPEG')
+QUALITY = 80
+FAILED_TIMEOUT = 10 * 60
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def workers():
+    return getattr(settings, 'POSTS_THUMBNAIL_WORKERS', WORKERS)
+
+
+def widths(image_width=None):
+    """Ширины копий; шире оригинала — только одна, самая узкая."""
+    configured = sorted(getattr(settings, 'POSTS_IMAGE_WIDTHS', WIDTHS))
+    if not image_width:
+        return configured
+    fitting = [width for width in configured if width <= image_width]
+    return fitting or configured[:1]
+
+
+def formats():
+    return getattr(settings, 'POSTS_IMAGE_FORMATS', FORMATS)
+
+
+def frame_height(width):
+    return round(width * FRAME[1] / FRAME[0])
+
+
+def renditions(image_width=None):
+    """Пары (геометрия, опции sorl) всех копий картинки."""
+    return [
+        (f'{width}x{frame_height(width)}', {
+            'crop': 'center', 'upscale': True,
+            'format': image_format, 'quality': QUALITY,
+        })
+        for image_format in formats()
+        for width in widths(image_width)
+    ]
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=workers(), thread_name_prefix='thumbnails'
+            )
+        return _executor
+
+
+class Engine(pil_engine.Engine):
+    """Движок PIL из sorl без Image.ANTIALIAS, убранного в Pillow 10."""
+
+    def _scale(self, image, width, height):
+        return image.resize(
+            (width, height), resample=pil_engine.Image.LANCZOS
+        )
+
+
+class DeferredThumbnailBackend(ThumbnailBackend):
+    """Не создаёт миниатюру при отрисовке, а ставит её в очередь."""
+
+    def _options(self, source, options):
+        # Те же умолчания, что подставляет ThumbnailBackend.get_thumbnail:
+        # от них зависит имя файла миниатюры.
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    def lookup(self, file_, geometry_string, **options):
+        """Готовая миниатюра или None, если её ещё нет."""
+        source = ImageFile(file_)
+        name = self._get_thumbnail_filename(
+            source, geometry_string, self._options(source, options)
+        )
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+    def generate(self, file_, geometry_string, **options):
+        """Создаёт миниатюру или бросает OSError.
+
+        sorl, не прочитав исходник, только пишет в лог и возвращает
+        несохранённую миниатюру, поэтому результат проверяется по
+        key-value хранилищу.
+        """
+        super().get_thumbnail(file_, geometry_string, **options)
+        thumbnail = self.lookup(file_, geometry_string, **options)
+        if not thumbnail:
+            raise OSError(f'Миниатюра {geometry_string} не создана')
+        return thumbnail
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        thumbnail = self.lookup(file_, geometry_string, **options)
+        if thumbnail:
+            return thumbnail
+        schedule(getattr(file_, 'name', file_),
+                 ((geometry_string, options),))
+        return ImageFile(file_)
+
+
+def get_backend():
+    backend = default.backend
+    if not isinstance(backend, DeferredThumbnailBackend):
+        backend = DeferredThumbnailBackend()
+    return backend
+
+
+def _keys(name, specs):
+    return {
+        (name, geometry, options.get('format')) for geometry, options in specs
+    }
+
+
+def _failed_key(name):
+    return 'posts:thumbnail-failed:' + hashlib.md5(name.encode()).hexdigest()
+
+
+def has_failed(name):
+    """Копии картинки недавно не удалось создать."""
+    return cache.get(_failed_key(name)) is not None
+
+
+def generate(name, specs, tags=()):
+    """Создаёт копии картинки и сбрасывает кэш зависящих страниц.
+
+    При ошибке кэш страниц не трогается: в них и так оригинал.
+    """
+    backend = get_backend()
+    source = ImageFile(name, post_images)
+    try:
+        for geometry, options in specs:
+            backend.generate(source, geometry, **options)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s', name)
+        cache.set(_failed_key(name), True, FAILED_TIMEOUT)
+        return
+    finally:
+        with _lock:
+            _pending.difference_update(_keys(name, specs))
+    if tags:
+        caching.invalidate(*tags)
+
+
+def _enqueue(name, specs, tags):
+    if has_failed(name):
+        return
+    keys = _keys(name, specs)
+    with _lock:
+        if keys <= _pending:
+            return
+        _pending.update(keys)
+    if not workers():
+        generate(name, specs, tags)
+        return
+
+    def job():
+        try:
+            generate(name, specs, tags)
+        finally:
+            # У потока пула свои соединения с базой.
+            connections.close_all()
+    _get_executor().submit(job)
+
+
+def schedule(name, specs, tags=()):
+    """Ставит копии (геометрия, опции) в очередь после фиксации транзакции.
+
+    Повторная постановка той же картинки, пока она в очереди,
+    ничего не делает.
+    """
+    transaction.on_commit(lambda: _enqueue(name, specs, tags))
+
+
+def schedule_post(post):
+    """Копии картинки поста; страницы с постом обновятся по готовности."""
+    if post.image:
+        schedule(post.image.name, renditions(post.image_width),
+                 tags=caching.post_tags(post, post.group_id))
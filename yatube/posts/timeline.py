@@ -0,0 +1,272 @@
+"""Лента подписок с раскладкой постов при записи (fan-out on write).
+
+Новый пост сразу попадает в ленты всех подписчиков автора, поэтому
+follow_index читает готовую ленту пользователя одним диапазоном по
+индексу, без соединения Follow и Post. Посты авторов, у которых
+подписчиков больше POSTS_TIMELINE_FANOUT_LIMIT, не раскладываются:
+они подмешиваются в ленту при чтении (fan-out on read). Список таких
+авторов один на всех и живёт в кэше PULLED_TIMEOUT секунд, а при чтении
+пересекается с кэшированным множеством подписок (posts.following).
+
+Хранилище выбирается настройкой POSTS_TIMELINE_BACKEND.
+"""
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db.models import F, Q
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from . import following
+from .models import Follow, Post, Profile, TimelineEntry
+
+DEFAULT_BACKEND = 'posts.timeline.DatabaseTimeline'
+FANOUT_LIMIT = 5000
+BACKFILL = 200
+BATCH_SIZE = 500
+PULLED_TIMEOUT = 5 * 60
+PULLED_KEY = 'posts:timeline:pulled'
+
+
+class BaseTimeline(ABC):
+    """Интерфейс хранилища лент."""
+
+    @abstractmethod
+    def add(self, post, user_ids):
+        """Добавляет пост в ленты перечисленных пользователей."""
+
+    @abstractmethod
+    def backfill(self, user_id, author_id, posts):
+        """Добавляет в ленту пользователя последние посты автора."""
+
+    def backfill_many(self, backfills):
+        """backfill для тройек (пользователь, автор, посты)."""
+        for user_id, author_id, posts in backfills:
+            self.backfill(user_id, author_id, posts)
+
+    @abstractmethod
+    def prune(self, user_id, author_id):
+        """Убирает из ленты пользователя посты автора."""
+
+    @abstractmethod
+    def posts(self, user_id, pull_author_ids=()):
+        """Посты ленты с аннотацией feed_date для паджинатора."""
+
+
+class DatabaseTimeline(BaseTimeline):
+    """Ленты в таблице TimelineEntry."""
+
+    def _create(self, entries):
+        TimelineEntry.objects.bulk_create(
+            entries, batch_size=BATCH_SIZE, ignore_conflicts=True
+        )
+
+    def add(self, post, user_ids):
+        self._create(
+            TimelineEntry(user_id=user_id, post_id=post.pk,
+                          author_id=post.author_id, pub_date=post.pub_date)
+            for user_id in user_ids
+        )
+
+    def backfill(self, user_id, author_id, posts):
+        self._create(
+            TimelineEntry(user_id=user_id, post_id=post_id,
+                          author_id=author_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        )
+
+    def backfill_many(self, backfills):
+        # Одна пачка INSERT на всех, а не запрос на каждую подписку.
+        self._create(
+            TimelineEntry(user_id=user_id, post_id=post_id,
+                          author_id=author_id, pub_date=pub_date)
+            for user_id, author_id, posts in backfills
+            for post_id, pub_date in posts
+        )
+
+    def prune(self, user_id, author_id):
+        TimelineEntry.objects.filter(
+            user_id=user_id, author_id=author_id
+        ).delete()
+
+    def posts(self, user_id, pull_author_ids=()):
+        if not pull_author_ids:
+            return Post.objects.filter(
+                timeline_entries__user_id=user_id
+            ).annotate(feed_date=F('timeline_entries__pub_date'))
+        entries = TimelineEntry.objects.filter(
+            user_id=user_id
+        ).values('post_id')
+        return Post.objects.filter(
+            Q(id__in=entries) | Q(author_id__in=pull_author_ids)
+        ).annotate(feed_date=F('pub_date'))
+
+
+class LocMemTimeline(BaseTimeline):
+    """Ленты в памяти процесса — для тестов и разработки."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def add(self, post, user_ids):
+        for user_id in user_ids:
+            self.entries.setdefault(user_id, {})[post.pk] = post.author_id
+
+    def backfill(self, user_id, author_id, posts):
+        timeline = self.entries.setdefault(user_id, {})
+        for post_id, _ in posts:
+            timeline[post_id] = author_id
+
+    def prune(self, user_id, author_id):
+        timeline = self.entries.get(user_id, {})
+        for post_id in [
+            post_id for post_id, author in timeline.items()
+            if author == author_id
+        ]:
+            del timeline[post_id]
+
+    def posts(self, user_id, pull_author_ids=()):
+        post_ids = list(self.entries.get(user_id, {}))
+        return Post.objects.filter(
+            Q(id__in=post_ids) | Q(author_id__in=pull_author_ids)
+        ).annotate(feed_date=F('pub_date'))
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'POSTS_TIMELINE_BACKEND', DEFAULT_BACKEND)
+        _backend = import_string(path)()
+    return _backend
+
+
+@receiver(setting_changed)
+def reset_backend(setting, **kwargs):
+    global _backend
+    if setting == 'POSTS_TIMELINE_BACKEND':
+        _backend = None
+    elif setting == 'POSTS_TIMELINE_FANOUT_LIMIT':
+        cache.delete(PULLED_KEY)
+
+
+def fanout_limit():
+    return getattr(settings, 'POSTS_TIMELINE_FANOUT_LIMIT', FANOUT_LIMIT)
+
+
+def is_pulled(author_id):
+    """Посты автора читаются при запросе, а не раскладываются."""
+    pulled = Profile.objects.filter(
+        user_id=author_id, followers_count__gt=fanout_limit()
+    ).exists()
+    # Автор только что перешёл порог: без сброса кэша его посты
+    # не попадут в ленты до истечения PULLED_TIMEOUT.
+    if pulled and author_id not in pulled_author_ids():
+        cache.delete(PULLED_KEY)
+    return pulled
+
+
+def pulled_author_ids():
+    """id всех авторов, чьи посты читаются при запросе, из кэша."""
+    ids = cache.get(PULLED_KEY)
+    if ids is None:
+        ids = frozenset(Profile.objects.filter(
+            followers_count__gt=fanout_limit()
+        ).values_list('user_id', flat=True))
+        cache.set(PULLED_KEY, ids, PULLED_TIMEOUT)
+    return ids
+
+
+def post_published(post):
+    if is_pulled(post.author_id):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    get_backend().add(post, follower_ids.iterator())
+
+
+def _recent_posts(author_id):
+    backfill = getattr(settings, 'POSTS_TIMELINE_BACKFILL', BACKFILL)
+    return list(Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'pub_date')[:backfill])
+
+
+def author_followed(user_id, author_id):
+    if is_pulled(author_id):
+        return
+    get_backend().backfill(user_id, author_id, _recent_posts(author_id))
+
+
+def _chunk_backfills(author_ids):
+    backfill = getattr(settings, 'POSTS_TIMELINE_BACKFILL', BACKFILL)
+    recent = {}
+    for post_id, author_id, pub_date in Post.objects.filter(
+        author_id__in=author_ids
+    ).order_by('author_id', '-pub_date', '-id').values_list(
+        'id', 'author_id', 'pub_date'
+    ).iterator():
+        posts = recent.setdefault(author_id, [])
+        if len(posts) < backfill:
+            posts.append((post_id, pub_date))
+    for user_id, author_id in Follow.objects.filter(
+        author_id__in=author_ids
+    ).values_list('user_id', 'author_id').iterator():
+        yield user_id, author_id, recent.get(author_id, ())
+
+
+def rebuild():
+    """Заново раскладывает ленты по всем подпискам (после bulk_create).
+
+    Авторы обрабатываются пачками по BATCH_SIZE: на пачку уходит
+    несколько запросов, сколько бы в ней ни было подписок.
+    """
+    backend = get_backend()
+    if isinstance(backend, DatabaseTimeline):
+        TimelineEntry.objects.all().delete()
+    pulled = pulled_author_ids()
+    author_ids = [
+        author_id for author_id in Follow.objects.order_by(
+            'author_id'
+        ).values_list('author_id', flat=True).distinct()
+        if author_id not in pulled
+    ]
+    for start in range(0, len(author_ids), BATCH_SIZE):
+        backend.backfill_many(
+            _chunk_backfills(author_ids[start:start + BATCH_SIZE])
+        )
+
+
+def author_unfollowed(user_id, author_id):
+    get_backend().prune(user_id, author_id)
+    left_pulled = Profile.objects.filter(
+        user_id=author_id, followers_count=fanout_limit()
+    ).exists()
+    if left_pulled:
+        # Посты, написанные, пока автор был выше порога, в ленты не
+        # раскладывались, а подмешивать его при чтении больше не будут.
+        cache.delete(PULLED_KEY)
+        posts = _recent_posts(author_id)
+        get_backend().backfill_many(
+            (follower_id, author_id, posts)
+            for follower_id in Follow.objects.filter(
+                author_id=author_id
+            ).values_list('user_id', flat=True).iterator()
+        )
+
+
+def feed(user):
+    """Лента подписок пользователя, сортировка по ('-feed_date', '-id').
+
+    Подмешиваемые авторы берутся из кэша, а не соединением Follow
+    и Profile, так что запрос не зависит от числа подписок.
+    """
+    pull_author_ids = pulled_author_ids()
+    if pull_author_ids:
+        pull_author_ids &= following.author_ids(user)
+    return get_backend().posts(user.pk, sorted(pull_author_ids))
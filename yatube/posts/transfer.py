@@ -0,0 +1,186 @@
+"""Потоковые выгрузка и загрузка данных постов (NDJSON и CSV).
+
+Выгрузка читает таблицу iterator(chunk_size=...) по первичному ключу,
+загрузка собирает записи в пачки для bulk_create. В памяти держится
+не больше одной пачки, поэтому размер файла не важен. Номер последней
+сохранённой записи пишется в файл контрольной точки: прерванную
+загрузку можно запустить снова, и она продолжит с того же места.
+
+bulk_create не вызывает сигналы, поэтому после загрузки производные
+данные (счётчики, поисковый индекс, ленты, кэш) пересобираются целиком.
+"""
+import csv
+import json
+import os
+from collections import namedtuple
+from contextlib import contextmanager
+from itertools import islice
+
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from . import counts, ranking, search, timeline
+from .models import Comment, Follow, Group, Post
+
+FORMATS = ('ndjson', 'csv')
+BATCH_SIZE = 1000
+CHUNK_SIZE = 2000
+
+Spec = namedtuple('Spec', 'model fields')
+
+SPECS = {
+    'groups': Spec(Group, ('id', 'title', 'slug', 'description')),
+    'posts': Spec(Post, (
+        'id', 'text', 'pub_date', 'author_id', 'group_id',
+        'image', 'image_width', 'image_height',
+    )),
+    'comments': Spec(Comment, (
+        'id', 'post_id', 'author_id', 'text', 'created',
+    )),
+    'follows': Spec(Follow, ('id', 'user_id', 'author_id')),
+}
+
+
+def export_rows(name, chunk_size=CHUNK_SIZE):
+    """Строки таблицы словарями, по возрастанию первичного ключа."""
+    spec = SPECS[name]
+    return spec.model.objects.order_by('pk').values(
+        *spec.fields
+    ).iterator(chunk_size=chunk_size)
+
+
+def write(rows, stream, fmt, fields):
+    """Пишет строки в поток, возвращает их число."""
+    written = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=fields)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({
+                key: '' if value is None else _text(value)
+                for key, value in row.items()
+            })
+            written += 1
+        return written
+    for row in rows:
+        # Даты — полным isoformat: DjangoJSONEncoder срезает микросекунды.
+        line = json.dumps(row, default=_text, ensure_ascii=False)
+        stream.write(f'{line}\n')
+        written += 1
+    return written
+
+
+def _text(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def read(stream, fmt):
+    """Записи файла словарями, по одной."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _builder(spec):
+    fields = [spec.model._meta.get_field(name) for name in spec.fields]
+
+    def build(record):
+        values = {}
+        for field in fields:
+            value = record.get(field.attname)
+            if value in ('', None) and field.null:
+                value = None
+            elif value is not None:
+                value = field.to_python(value)
+            values[field.attname] = value
+        return spec.model(**values)
+    return build
+
+
+@contextmanager
+def keep_dates(model):
+    """Не даёт auto_now_add затереть даты из файла."""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Checkpoint:
+    """Число уже сохранённых записей в файле рядом с загрузкой."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        with open(self.path) as file:
+            return int(file.read().strip() or 0)
+
+    def save(self, done):
+        if not self.path:
+            return
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as file:
+            file.write(str(done))
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def load(name, records, batch_size=BATCH_SIZE, checkpoint=None,
+         progress=None):
+    """Сохраняет записи пачками; возвращает число обработанных записей.
+
+    Уже существующие строки (тот же первичный ключ или уникальные поля)
+    пропускаются, так что повторная загрузка того же файла безопасна.
+    """
+    spec = SPECS[name]
+    build = _builder(spec)
+    checkpoint = checkpoint or Checkpoint(None)
+    done = checkpoint.load()
+    records = islice(records, done, None)
+    with keep_dates(spec.model):
+        while True:
+            batch = [build(record) for record in islice(records, batch_size)]
+            if not batch:
+                break
+            with transaction.atomic():
+                spec.model.objects.bulk_create(batch, ignore_conflicts=True)
+            done += len(batch)
+            checkpoint.save(done)
+            if progress:
+                progress(done)
+    _reset_sequences(spec.model)
+    checkpoint.clear()
+    return done
+
+
+def _reset_sequences(model):
+    statements = connection.ops.sequence_reset_sql(no_style(), [model])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def rebuild_derived():
+    """Пересобирает то, что обычно поддерживают сигналы."""
+    cache.clear()
+    counts.recount()
+    search.rebuild()
+    timeline.rebuild()
+    ranking.rebuild()
@@ -0,0 +1,121 @@
+"""Приём картинок постов с ограниченным расходом памяти.
+
+Загрузка пишется во временный файл кусками (BoundedUploadHandler
+в FILE_UPLOAD_HANDLERS). Файл больше POSTS_IMAGE_MAX_BYTES удаляется
+и не попадает в request.FILES, а имя его поля запоминается в запросе
+(oversized), чтобы форма показала ошибку. Формат и размеры
+в пикселях проверяются по заголовку, без декодирования картинки.
+Оригиналы больше POSTS_IMAGE_MAX_SIDE уменьшаются до сохранения;
+JPEG при этом декодируется сразу в уменьшенном масштабе.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadhandler import (SkipFile,
+                                             TemporaryFileUploadHandler)
+from PIL import Image
+
+MAX_BYTES = 10 * 1024 * 1024
+MAX_PIXELS = 40 * 1000 * 1000
+MAX_SIDE = 2560
+FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+JPEG_QUALITY = 90
+
+
+def max_bytes():
+    return getattr(settings, 'POSTS_IMAGE_MAX_BYTES', MAX_BYTES)
+
+
+def max_pixels():
+    return getattr(settings, 'POSTS_IMAGE_MAX_PIXELS', MAX_PIXELS)
+
+
+def max_side():
+    return getattr(settings, 'POSTS_IMAGE_MAX_SIDE', MAX_SIDE)
+
+
+def oversized(request):
+    """Имена полей, файлы которых отброшены из-за размера."""
+    # Обработчики загрузки работают при разборе тела запроса.
+    request.FILES
+    return frozenset(getattr(request, '_oversized_uploads', ()))
+
+
+def too_large():
+    return ValidationError(
+        'Файл больше %(limit)s МБ.',
+        code='too_large',
+        params={'limit': max_bytes() // (1024 * 1024)},
+    )
+
+
+class BoundedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку во временный файл, но не больше max_bytes().
+
+    Файл, превысивший предел, удаляется и пропускается (SkipFile),
+    так что ни одна форма не получит его обрезанным.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > max_bytes():
+            self.file.close()
+            if not hasattr(self.request, '_oversized_uploads'):
+                self.request._oversized_uploads = set()
+            self.request._oversized_uploads.add(self.field_name)
+            raise SkipFile()
+        self.file.write(raw_data)
+
+
+def inspect(file):
+    """Формат, размеры и число кадров картинки по её заголовку."""
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            info = image.format, image.size, getattr(image, 'n_frames', 1)
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError(
+            'Загрузите картинку в формате JPEG, PNG, GIF или WebP.',
+            code='invalid_image',
+        )
+    finally:
+        file.seek(0)
+    image_format, (width, height), frames = info
+    if image_format not in FORMATS:
+        raise ValidationError(
+            'Загрузите картинку в формате JPEG, PNG, GIF или WebP.',
+            code='invalid_image',
+        )
+    if width * height * frames > max_pixels():
+        raise ValidationError(
+            'Картинка %(width)s×%(height)s слишком большая.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height},
+        )
+    return info
+
+
+def fit(file, image_format, size, frames):
+    """Уменьшает картинку до max_side() по большей стороне.
+
+    Анимацию и картинки, которые и так помещаются, возвращает как есть.
+    """
+    limit = max_side()
+    if max(size) <= limit or frames > 1:
+        return file
+    file.seek(0)
+    with Image.open(file) as image:
+        # Для JPEG декодер сразу уменьшает картинку в 2–8 раз.
+        image.draft('RGB', (limit, limit))
+        image.thumbnail((limit, limit))
+        # Картинка уже в памяти: перезаписываем тот же временный файл.
+        file.seek(0)
+        file.truncate()
+        options = {'quality': JPEG_QUALITY} if image_format == 'JPEG' else {}
+        image.save(file, image_format, **options)
+    file.size = file.tell()
+    file.seek(0)
+    return file
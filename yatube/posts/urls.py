@@ -7,9 +7,26 @@ app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('popular/', views.popular, name='popular'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    path(
+        'group/<slug:slug>/popular/',
+        views.group_popular,
+        name='group_popular'
+    ),
+    path('search/', views.search_posts, name='search'),
     # Профайл пользователя
     path('profile/<str:username>/', views.profile, name='profile'),
+    path(
+        'profile/<str:username>/followers/',
+        views.profile_followers,
+        name='followers'
+    ),
+    path(
+        'profile/<str:username>/following/',
+        views.profile_following,
+        name='following'
+    ),
     # Просмотр записи
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     # Создание записи
@@ -17,8 +34,14 @@ urlpatterns = [
     # Редактирование записи
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/', views.add_comment, name='add_comment'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     # Подписки и отписки
     path('follow/', views.follow_index, name='follow_index'),
+    path('follow/batch/', views.follow_batch, name='follow_batch'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
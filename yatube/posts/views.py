@@ -1,37 +1,106 @@
+from http import HTTPStatus
+from urllib.parse import urlencode
+
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.core.paginator import EmptyPage
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.utils.http import is_safe_url
+from django.views.decorators.http import require_POST
 
+from . import (following, queries, ranking, search, suggestions, thumbnails,
+               uploads)
+from .caching import (cache_tagged, depends_on, depends_on_posts,
+                      page_timeout)
+from .conditional import (author_state, conditional, group_state, index_state,
+                          post_state)
+from .counts import posts_count
 from .forms import PostForm, CommentForm
 from .models import Group, Post, User, Follow
+from .paginator import KeysetPaginator
 
 AMOUNT_POST = 10
+AMOUNT_COMMENTS = 20
+FOLLOW_BATCH_LIMIT = 100
+
+
+def page_context(request, posts, count=None, keys=('-pub_date', '-id')):
+    """Паджинатор по курсорам ?after= и ?before= (?page= для старых ссылок)."""
+    paginator = KeysetPaginator(posts, AMOUNT_POST, keys=keys, count=count)
+    try:
+        return paginator.get_page(
+            request.GET.get('page'),
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
+    except EmptyPage:
+        raise Http404('Нет такой страницы')
+
 
-def page_context(request, posts):
-    """Паджинатор."""
-    paginator = Paginator(posts, AMOUNT_POST)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+def comments_page(post, after=None):
+    """Страница комментариев поста в порядке добавления."""
+    paginator = KeysetPaginator(
+        queries.post_comments(post), AMOUNT_COMMENTS,
+        keys=('created', 'id'), count=post.comments_count,
+    )
+    try:
+        return paginator.get_page(after=after)
+    except EmptyPage:
+        raise Http404('Нет такой страницы')
 
-@cache_page(20)
+
+@conditional(index_state)
+@cache_tagged(authenticated=False)
 def index(request):
     """Функция для отображения главной страницы проекта."""
     template = 'posts/index.html'
-    post_list = Post.objects.select_related("group").all()
-    page_obj = page_context(request, post_list)
+    depends_on(request, 'posts')
+    post_list = queries.index_posts()
+    page_obj = page_context(request, post_list, count=posts_count())
+    depends_on_posts(request, page_obj)
     context = {
         'page_obj': page_obj,
+        'cache_timeout': page_timeout(),
     }
     return render(request, template, context)
 
 
+@cache_tagged
+def popular(request):
+    """Популярные посты: по затухающей оценке из posts.ranking."""
+    # Оценки меняет rank_posts, а правки и удаление постов — сигналы.
+    depends_on(request, 'posts', ranking.TAG)
+    page_obj = page_context(request, queries.popular_posts(),
+                            keys=('-score', '-rank_post'))
+    context = {
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/popular.html', context)
+
+
+@cache_tagged
+def group_popular(request, slug):
+    """Популярные посты сообщества."""
+    group = get_object_or_404(Group, slug=slug)
+    depends_on(request, 'posts', ranking.TAG, f'group:{group.pk}')
+    page_obj = page_context(request, queries.group_popular_posts(group),
+                            keys=('-score', '-rank_post'))
+    context = {
+        'page_obj': page_obj,
+        'group': group,
+    }
+    return render(request, 'posts/popular.html', context)
+
+
+@conditional(group_state)
+@cache_tagged
 def group_posts(request, slug):
     """Функция для отображения страницы сообщества."""
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    groups_posts = group.posts.select_related('author')
-    page_obj = page_context(request, groups_posts)
+    depends_on(request, f'group:{group.pk}')
+    groups_posts = queries.group_posts(group)
+    page_obj = page_context(request, groups_posts, count=group.posts_count)
     context = {
         'page_obj': page_obj,
         'posts': groups_posts,
@@ -40,49 +109,159 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@conditional(author_state)
+@cache_tagged
 def profile(request, username):
     """Функция для отображения профиля пользователя."""
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.select_related('group')
-    page_obj = page_context(request, post_list)
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user, author=author
-        ).exists()
-    else:
-        following = False
+    author = get_object_or_404(
+        User.objects.select_related('profile'), username=username
+    )
+    depends_on(request, f'author:{author.pk}')
+    post_list = queries.author_posts(author)
+    page_obj = page_context(
+        request, post_list, count=author.profile.posts_count
+    )
     context = {
         'author': author,
-        'following': following,
+        'following': author.pk in following.for_request(request),
         'page_obj': page_obj,
     }
     return render(request, template, context)
 
 
+@conditional(post_state)
+@cache_tagged
 def post_detail(request, post_id):
     """Функция для отображения конкретной записи."""
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post.objects.select_related('group'), id=post_id)
-    comments = post.comments.select_related('post')
+    post = get_object_or_404(queries.post_detail(), id=post_id)
+    depends_on(
+        request,
+        f'post:{post.pk}', f'author:{post.author_id}', f'group:{post.group_id}'
+    )
     context = {
         'post': post,
         'form': CommentForm(),
+        'comments': comments_page(post),
+    }
+    return render(request, template, context)
+
+
+@conditional(post_state)
+@cache_tagged
+def post_comments(request, post_id):
+    """Следующая страница комментариев для кнопки «Показать ещё».
+
+    Отдаёт HTML-фрагмент, а с ?format=json — комментарии и курсор.
+    """
+    post = get_object_or_404(
+        Post.objects.only('id', 'author_id', 'group_id', 'comments_count'),
+        pk=post_id,
+    )
+    depends_on(
+        request,
+        f'post:{post.pk}', f'author:{post.author_id}', f'group:{post.group_id}'
+    )
+    comments = comments_page(post, after=request.GET.get('after'))
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created,
+                }
+                for comment in comments
+            ],
+            'next': comments.next_cursor,
+        })
+    context = {
+        'post': post,
         'comments': comments,
     }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
+def search_posts(request):
+    """Поиск по тексту постов с фильтрами по группе и автору."""
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    group = request.GET.get('group', '')
+    author = request.GET.get('author', '')
+    posts = queries.index_posts()
+    if group:
+        posts = posts.filter(group__slug=group)
+    if author:
+        posts = posts.filter(author__username=author)
+    posts, keys = search.search(posts, query)
+    filters = {
+        name: value for name, value in
+        (('q', query), ('group', group), ('author', author)) if value
+    }
+    context = {
+        'page_obj': page_context(request, posts, keys=keys),
+        'page_query': f'{urlencode(filters)}&' if filters else '',
+        'query': query,
+        'group': group,
+        'author': author,
+        'groups': Group.objects.only('slug', 'title'),
+    }
     return render(request, template, context)
 
 
+def follow_list(request, username, relation):
+    """Подписчики (relation='followers') или подписки пользователя."""
+    template = 'posts/follow_list.html'
+    author = get_object_or_404(
+        User.objects.select_related('profile'), username=username
+    )
+    depends_on(request, f'author:{author.pk}')
+    if request.user.is_authenticated:
+        # Флаг «подписан на вас» меняется с подписчиками смотрящего.
+        depends_on(request, f'author:{request.user.pk}')
+    if relation == 'followers':
+        follows = queries.followers(author, request.user)
+        count, person = author.profile.followers_count, 'user'
+    else:
+        follows = queries.following(author, request.user)
+        count, person = author.profile.following_count, 'author'
+    page_obj = page_context(request, follows, count=count, keys=('-id',))
+    context = {
+        'author': author,
+        'relation': relation,
+        'page_obj': page_obj,
+        'people': [
+            (getattr(follow, person), follow.follows_you)
+            for follow in page_obj
+        ],
+    }
+    return render(request, template, context)
+
+
+@cache_tagged
+def profile_followers(request, username):
+    return follow_list(request, username, 'followers')
+
+
+@cache_tagged
+def profile_following(request, username):
+    return follow_list(request, username, 'following')
+
+
 @login_required
 def post_create(request):
     """Функция для создания записи."""
     template = 'posts/create_post.html'
     post = Post.objects.select_related('author')
-    form = PostForm(request.POST or None, request.FILES or None)
+    form = PostForm(request.POST or None, request.FILES or None,
+                    oversized=uploads.oversized(request))
     if request.method == 'POST' and form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.schedule_post(post)
         return redirect('post:profile', post.author.username)
     context = {
         'post': post,
@@ -97,13 +276,16 @@ def post_edit(request, post_id):
     """Функция для редактирования записи."""
     template = 'posts/create_post.html'
     edit_post = get_object_or_404(Post, pk=post_id)
-    form = PostForm(request.POST or None, files=request.FILES or None, instance=edit_post)
+    form = PostForm(request.POST or None, request.FILES or None,
+                    instance=edit_post, oversized=uploads.oversized(request))
 
     if edit_post.author != request.user:
         return redirect('posts:post_detail', post_id=post_id)
 
     if request.method == 'POST' and form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule_post(post)
         return redirect('posts:post_detail', post_id=post_id)
 
     context = {
@@ -114,13 +296,18 @@ def post_edit(request, post_id):
     return render(request, template, context)
 
 
+def is_xhr(request):
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+
 @login_required
 def add_comment(request, post_id):
     """Функция для добавления комментария."""
     template = 'posts/post_detail.html'
     form = CommentForm(request.POST or None)
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.select_related('post')
+    if request.method == 'POST' and is_xhr(request):
+        return add_comment_fragment(request, post_id, form)
+    post = get_object_or_404(queries.post_detail(), pk=post_id)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
@@ -129,40 +316,98 @@ def add_comment(request, post_id):
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
-        'comments': comments,
+        'comments': comments_page(post),
         'form': form,
     }
     return render(request, template, context)
 
 
+def add_comment_fragment(request, post_id, form):
+    """add_comment для fetch/XHR: только новый комментарий или ошибки.
+
+    Пост и его комментарии не загружаются и страница не отрисовывается:
+    при успехе — один INSERT и фрагмент со статусом 201, иначе форма
+    с ошибками и статус 400.
+    """
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404('Пост не найден')
+    if not form.is_valid():
+        context = {'form': form, 'post_id': post_id}
+        return render(request, 'posts/includes/comment_form.html',
+                      context, status=HTTPStatus.BAD_REQUEST)
+    comment = form.save(commit=False)
+    comment.author = request.user
+    comment.post_id = post_id
+    comment.save()
+    return render(request, 'posts/includes/comment.html',
+                  {'comment': comment}, status=HTTPStatus.CREATED)
+
+
 @login_required
 def follow_index(request):
     """Подписка на пользователя."""
     template = 'posts/follow.html'
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = page_context(request, posts)
+    posts = queries.follow_posts(request.user)
+    page_obj = page_context(request, posts, keys=('-feed_date', '-id'))
     context = {
         'page_obj': page_obj,
+        'suggestions': suggestions.for_request(request),
     }
     return render(request, template, context)
 
 
+def redirect_back(request, *args, **kwargs):
+    """Возврат на страницу из ?next=, если она с этого сайта."""
+    url = request.GET.get('next')
+    if url and is_safe_url(url, allowed_hosts={request.get_host()},
+                           require_https=request.is_secure()):
+        return redirect(url)
+    return redirect(*args, **kwargs)
+
+
 @login_required
 def profile_follow(request, username):
     """Функция для подписки на автора."""
     author = get_object_or_404(User, username=username)
-    user = request.user
-    if author != user:
-        Follow.objects.get_or_create(user=request.user, author=author)
-    return redirect('posts:profile', username)
+    Follow.objects.follow(request.user.pk, author.pk)
+    return redirect_back(request, 'posts:profile', username)
 
 
 @login_required
 def profile_unfollow(request, username):
     """Функция для отписки от автора."""
     author = get_object_or_404(User, username=username)
-    user = request.user
-    follower = Follow.objects.filter(user=user, author=author)
-    if follower.exists():
-        follower.delete()
-    return redirect('posts:profile', username=author)
+    Follow.objects.unfollow(request.user.pk, author.pk)
+    return redirect_back(request, 'posts:profile', username=author)
+
+
+@login_required
+@require_POST
+def follow_batch(request):
+    """Подписка или отписка от нескольких авторов (author=...) сразу.
+
+    Отвечает JSON со списком авторов, для которых что-то изменилось.
+    """
+    action = request.POST.get('action')
+    usernames = request.POST.getlist('author')
+    if action not in ('follow', 'unfollow') or not usernames:
+        return JsonResponse(
+            {'error': 'Нужны action=follow|unfollow и author.'},
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    if len(usernames) > FOLLOW_BATCH_LIMIT:
+        return JsonResponse(
+            {'error': f'Не больше {FOLLOW_BATCH_LIMIT} авторов за раз.'},
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    authors = dict(User.objects.filter(
+        username__in=usernames
+    ).values_list('pk', 'username'))
+    if action == 'follow':
+        changed = Follow.objects.follow_many(request.user.pk, authors)
+    else:
+        changed = Follow.objects.unfollow_many(request.user.pk, authors)
+    return JsonResponse({
+        'action': action,
+        'changed': sorted(authors[author_id] for author_id in changed),
+    })
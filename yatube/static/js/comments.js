@@ -0,0 +1,58 @@
+// Кнопка «Показать ещё» подгружает следующую страницу комментариев
+// и встаёт на место себя. Комментарий, добавленный формой до того,
+// как дошли до конца списка, придёт и в подгруженной странице:
+// прежняя копия убирается, чтобы он встал на своё место по времени.
+document.addEventListener('click', function (event) {
+  var link = event.target.closest('[data-load-more]');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  fetch(link.href, {credentials: 'same-origin'})
+    .then(function (response) { return response.text(); })
+    .then(function (html) {
+      var page = document.createElement('div');
+      page.innerHTML = html;
+      page.querySelectorAll('[id^="comment-"]').forEach(function (comment) {
+        var added = document.getElementById(comment.id);
+        if (added) {
+          added.remove();
+        }
+      });
+      link.outerHTML = html;
+    });
+});
+
+// Форма комментария отправляется без перезагрузки: сервер отвечает
+// фрагментом нового комментария (201) или формой с ошибками (400).
+document.addEventListener('submit', function (event) {
+  var form = event.target.closest('[data-comment-form]');
+  if (!form) {
+    return;
+  }
+  event.preventDefault();
+  fetch(form.action, {
+    method: 'POST',
+    body: new FormData(form),
+    credentials: 'same-origin',
+    headers: {'X-Requested-With': 'XMLHttpRequest'}
+  }).then(function (response) {
+    return response.text().then(function (html) {
+      if (response.status === 201) {
+        // Новый комментарий — последний из показанных, перед «Показать ещё».
+        var list = document.getElementById('comments');
+        var more = list.querySelector('[data-load-more]');
+        if (more) {
+          more.insertAdjacentHTML('beforebegin', html);
+        } else {
+          list.insertAdjacentHTML('beforeend', html);
+        }
+        form.reset();
+      } else if (response.status === 400) {
+        form.outerHTML = html;
+      } else {
+        form.submit();
+      }
+    });
+  });
+});
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -48,13 +49,47 @@ INSTALLED_APPS = [
     'sorl.thumbnail',
 ]
 
-CACHES = {
-    'default': {
+# Кэш общий для всех воркеров: по умолчанию файловый, YATUBE_CACHE=db
+# хранит его в таблице SQLite (python manage.py createcachetable).
+# Тесты работают с локальным кэшем, чтобы не видеть данных прошлых запусков.
+TESTING = 'test' in sys.argv or 'pytest' in sys.modules
+
+# Команды нагрузочных замеров (bench_*) пишут в базу тестовые данные:
+# на боевом сайте приложение не подключается.
+BENCHMARKS = DEBUG or bool(os.getenv('YATUBE_BENCHMARKS'))
+if BENCHMARKS:
+    INSTALLED_APPS.append('benchmarks.apps.BenchmarksConfig')
+
+CACHE_BACKENDS = {
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'yatube_cache',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    },
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
 }
 
+CACHES = {
+    'default': dict(
+        CACHE_BACKENDS[
+            os.getenv('YATUBE_CACHE', 'locmem' if TESTING else 'file')
+        ],
+        KEY_PREFIX='yatube',
+        VERSION=int(os.getenv('YATUBE_CACHE_VERSION', 1)),
+        OPTIONS={'MAX_ENTRIES': 10000},
+    ),
+}
+
+# Страницы лент сбрасываются при изменениях, поэтому TTL может быть большим
+POSTS_CACHE_TIMEOUT = 60 * 60 * 6
+
 MIDDLEWARE = [
+    'core.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -68,7 +103,7 @@ ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.InstrumentedTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -78,6 +113,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'posts.context_processors.following_ids',
             ],
         },
     },
@@ -94,6 +130,34 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Лента подписок: хранилище, порог fan-out on read и глубина заполнения
+POSTS_TIMELINE_BACKEND = 'posts.timeline.DatabaseTimeline'
+POSTS_TIMELINE_FANOUT_LIMIT = 5000
+POSTS_TIMELINE_BACKFILL = 200
+
+# Сколько секунд множество подписок пользователя живёт в кэше
+POSTS_FOLLOWING_TIMEOUT = 5 * 60
+
+# Миниатюры создаются в фоновых потоках, шаблоны их не ждут
+THUMBNAIL_BACKEND = 'posts.thumbnails.DeferredThumbnailBackend'
+THUMBNAIL_ENGINE = 'posts.thumbnails.Engine'
+POSTS_THUMBNAIL_WORKERS = 2
+
+# Загрузки пишутся во временный файл с ограничением размера
+FILE_UPLOAD_HANDLERS = ['posts.uploads.BoundedUploadHandler']
+POSTS_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POSTS_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+POSTS_IMAGE_MAX_SIDE = 2560
+
+# Метрики запросов по view (core.metrics), сводка — /-/metrics/
+METRICS_ENABLED = True
+METRICS_SLOW_REQUEST_MS = 500
+METRICS_SLOW_SAMPLE_RATE = 1.0
+# Журнал медленных SQL-запросов с планами (manage.py slow_queries);
+# None отключает его, в тестах он не пишется.
+METRICS_SLOW_QUERY_MS = None if TESTING else 100
+METRICS_SLOW_QUERY_LOG = os.path.join(BASE_DIR, 'logs', 'slow_queries.ndjson')
+
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
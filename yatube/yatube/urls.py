@@ -1,10 +1,13 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import request_metrics
+
 handler404 = 'core.views.page_not_found'
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('-/metrics/', request_metrics, name='request_metrics'),
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('', include('posts.urls', namespace='post')),